@@ -0,0 +1,256 @@
+"""CSC343 Assignment 2
+
+=== Module Description ===
+
+This file contains the AsyncAirTravel class, an asyncio counterpart of
+AirTravel that runs its queries with asyncpg over a connection pool, so that
+a single event loop can keep many bookings in flight at once.
+
+The methods keep the return contracts of AirTravel: make_booking returns a
+bool, find_unreachable_from a list (or None), and reassign_plane a list.
+"""
+import asyncio
+from datetime import date, datetime
+from typing import Optional
+
+import asyncpg
+
+from a2_embedded import (
+    BidAllocator, _BOOK_SQL, _RESERVE_BIDS_SQL, _REASSIGN_DEMAND_SQL,
+    _REASSIGN_FLEET_SQL, _REASSIGN_SCHEDULE_SQL, _REASSIGN_TARGETS_SQL,
+    _REASSIGN_UPDATE_SQL, _UNREACHABLE_SQL, _numbered, _plan_reassignment,
+    _reassign_window, setup
+)
+
+
+async def _fetch(connection: asyncpg.Connection, sql: str,
+                 params: dict) -> list[asyncpg.Record]:
+    """Run <sql>, written with %(name)s placeholders for psycopg2, on
+    <connection> with the values in <params>, and return its rows.
+    """
+    text, names = _numbered(sql)
+    return await connection.fetch(text, *[params[name] for name in names])
+
+
+_BOOK_ASYNC_SQL, _BOOK_ASYNC_PARAMS = _numbered(_BOOK_SQL)
+_RESERVE_BIDS_ASYNC_SQL = _RESERVE_BIDS_SQL.replace("%s", "$1")
+
+
+class AsyncBidAllocator(BidAllocator):
+    """A BidAllocator whose reservations are made with asyncpg."""
+    _async_lock: asyncio.Lock
+
+    def __init__(self, block_size: int = 64) -> None:
+        """Initialize this allocator with no ids reserved yet."""
+        super().__init__(block_size)
+        self._async_lock = asyncio.Lock()
+
+    async def allocate_async(self, connection: asyncpg.Connection) -> int:
+        """Return a new booking id, reserving another block of ids using
+        <connection> if all reserved ids have been used.
+        """
+        async with self._async_lock:
+            with self._lock:
+                bids = self._take(1)
+                shortfall = self._shortfall(1)
+            if bids is None:
+                rows = await connection.fetch(_RESERVE_BIDS_ASYNC_SQL,
+                                              shortfall)
+                with self._lock:
+                    self._reserved.extend(sorted(row[0] for row in rows))
+                    bids = self._take(1)
+            return bids[0]
+
+
+class AsyncAirTravel:
+    """An asyncio counterpart of AirTravel.
+
+    === Instance Attributes ===
+    pool: the asyncpg pool of connections to a database conforming to the
+        schema used in A2, or None if this instance is not connected.
+    bids: the allocator that new booking ids are taken from.
+    """
+    pool: Optional[asyncpg.Pool]
+    bids: AsyncBidAllocator
+
+    def __init__(self) -> None:
+        """Initialize this instance, with no database connection yet."""
+        self.pool = None
+        self.bids = AsyncBidAllocator()
+
+    async def connect(self, dbname: str, username: str, password: str,
+                      min_size: int = 1, max_size: int = 10) -> bool:
+        """Create a pool of between <min_size> and <max_size> connections
+        to the database <dbname> using the username <username> and password
+        <password>, with the search path of every connection set to
+        AirTravel.
+
+        Return True if the pool was created successfully, False otherwise.
+        """
+        try:
+            self.pool = await asyncpg.create_pool(
+                database=dbname, user=username, password=password,
+                min_size=min_size, max_size=max_size,
+                server_settings={"search_path": "AirTravel"}
+            )
+            return True
+        except (OSError, asyncpg.PostgresError):
+            return False
+
+    async def disconnect(self) -> bool:
+        """Close this instance's pool.
+
+        Return True if closing the pool was successful, False otherwise.
+        """
+        try:
+            if self.pool is not None:
+                await self.pool.close()
+                self.pool = None
+            return True
+        except (OSError, asyncpg.PostgresError):
+            return False
+
+    async def make_booking(self, pid: int, seat: tuple[int, str], fid: int,
+                           timestamp: datetime) -> bool:
+        """Create a booking exactly like AirTravel.make_booking.
+
+        Return True if the booking is successful, and False otherwise.
+        """
+        if self.pool is None:
+            return False
+        outcome = "error"
+        try:
+            async with self.pool.acquire() as connection:
+                bid = await self.bids.allocate_async(connection)
+                row_val, letter = seat
+                params = {"bid": bid, "pid": pid, "fid": fid, "row": row_val,
+                          "letter": letter, "ts": timestamp}
+                outcome = await connection.fetchval(
+                    _BOOK_ASYNC_SQL,
+                    *[params[name] for name in _BOOK_ASYNC_PARAMS]
+                )
+        except Exception:
+            outcome = "error"
+        return outcome == "booked"
+
+    async def find_unreachable_from(self, airport: str) -> Optional[list]:
+        """Return the IATA codes of the airports that are not reachable from
+        <airport>, exactly like AirTravel.find_unreachable_from.
+        """
+        if self.pool is None:
+            return None
+        try:
+            async with self.pool.acquire() as connection:
+                exists = await connection.fetchval(
+                    "SELECT 1 FROM Airport WHERE code = $1", airport)
+                if exists is None:
+                    return None
+                rows = await _fetch(connection, _UNREACHABLE_SQL,
+                                    {"airport": airport})
+                return [row[0] for row in rows]
+        except Exception:
+            return None
+
+    async def reassign_plane(self, tail_number: str, start: date,
+                             end: date) -> list:
+        """Reassign planes to the flights that use <tail_number> between
+        <start> and <end> exactly like AirTravel.reassign_plane, and return
+        the ids of the flights for which no replacement was found.
+        """
+        unscheduled = []
+        if self.pool is None:
+            return unscheduled
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    return await self._reassign(connection, tail_number,
+                                                start, end)
+        except Exception:
+            return unscheduled
+
+    async def _reassign(self, connection: asyncpg.Connection,
+                        tail_number: str, start: date, end: date) -> list:
+        """Perform reassign_plane using <connection>, inside a transaction
+        that the caller commits, with the same queries and in-memory
+        planning as AirTravel._reassign.
+        """
+        params = {"planes": [tail_number], "start": start, "end": end}
+        targets = await _fetch(connection, _REASSIGN_TARGETS_SQL, params)
+        if not targets:
+            return []
+        params.update(_reassign_window(targets, start, end))
+        fleet = await _fetch(connection, _REASSIGN_FLEET_SQL, params)
+        schedule = await _fetch(connection, _REASSIGN_SCHEDULE_SQL, params)
+        demand = await _fetch(connection, _REASSIGN_DEMAND_SQL,
+                              {"fids": [target[0] for target in targets]})
+
+        updates, unscheduled = _plan_reassignment(
+            targets, fleet, schedule, demand, {tail_number}, start, end)
+        if updates:
+            await _fetch(connection, _REASSIGN_UPDATE_SQL, {
+                "fids": [fid for fid, _ in updates],
+                "tails": [plane for _, plane in updates]
+            })
+        return unscheduled
+
+
+def test_async_basics(dbname: str, user: str, password: str) -> None:
+    """Test AsyncAirTravel against the expectations of test_basics in
+    a2_embedded.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    asyncio.run(_check_async_basics(dbname, user, password))
+
+
+async def _check_async_basics(dbname: str, user: str, password: str) -> None:
+    """Run the checks of test_async_basics on one event loop."""
+    a2 = AsyncAirTravel()
+    try:
+        connected = await a2.connect(dbname, user, password)
+        assert connected, f"[Connect] Expected True | Got {connected}."
+
+        # ----------------------- Testing make_booking ----------------------- #
+        for request, expected in [
+                # Invalid pid
+                ((39, (6, 'A'), 8, datetime(2025, 1, 15, 10, 0)), False),
+                # Valid booking
+                ((17, (6, 'A'), 8, datetime(2025, 1, 15, 10, 0)), True),
+                # Seat is already occupied
+                ((7, (6, 'A'), 8, datetime(2025, 3, 2, 10, 0)), False)]:
+            booked = await a2.make_booking(*request)
+            assert booked == expected, \
+                f"[make_booking{request}] Expected {expected} - Got {booked}"
+
+        # Two requests for the same seat in flight at once: only one wins.
+        booked = sorted(await asyncio.gather(
+            a2.make_booking(17, (6, 'B'), 8, datetime(2025, 1, 15, 10, 0)),
+            a2.make_booking(7, (6, 'B'), 8, datetime(2025, 1, 15, 10, 0))))
+        expected = [False, True]
+        assert booked == expected, \
+            f"[make_booking same seat] Expected {expected} - Got {booked}"
+
+        # ------------------ Testing find_unreachable_from ------------------- #
+        expected = None
+        unreachable = await a2.find_unreachable_from("ABC")
+        assert unreachable is expected, \
+            f"[find_unreachable_from] Expected {expected} - Got {unreachable}"
+
+        expected = sorted([
+            "YTZ", "ATL", "LAX", "DFW", "DEN", "JFK",
+            "SFO", "SEA", "LAS", "MIA", "AMS", "DXB", "SIN",
+            "HKG", "ICN", "SYD", "PEK", "DEL", "GRU", "MEX", "JNB", "BKK",
+            "KUL", "IST"
+        ])
+        unreachable = sorted(await a2.find_unreachable_from("YYZ"))
+        assert unreachable == expected, \
+            f"[find_unreachable_from] Expected {expected} - Got {unreachable}"
+
+        # ---------------------- Testing reassign_plane ---------------------- #
+        expected = []
+        unscheduled = sorted(await a2.reassign_plane(
+            'D84KL', date(2024, 1, 1), date(2024, 8, 12)))
+        assert unscheduled == expected, \
+            f"[reassign_plane] Expected {expected} - Got {unscheduled}"
+    finally:
+        await a2.disconnect()
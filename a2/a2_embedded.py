@@ -19,10 +19,1489 @@ Copyright (c) 2025
 
 This file contains the AirTravel class and some simple testing functions.
 """
-from typing import Optional
-from datetime import date, datetime
+from typing import Callable, Iterable, Iterator, Optional
+from bisect import bisect, bisect_left, insort
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime, timedelta
+from functools import lru_cache, wraps
+import multiprocessing
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import weakref
 import psycopg2 as pg
 import psycopg2.extensions as pg_ext
+import psycopg2.extras as pg_extras
+import psycopg2.pool as pg_pool
+
+
+# 예약 검증과 삽입을 한 번의 왕복으로 처리한다. verdict 는 거절 사유를 기존
+# 검사 순서(승객, 항공편, 시각, 좌석, 중복, 가격)대로 계산하고, booked 는
+# verdict 가 "ok" 일 때만 행을 삽입한다. 검사 뒤에 다른 세션이 같은 좌석을
+# 먼저 예약했다면 UNIQUE (seat, flight) 에 막혀 삽입되지 않으므로, 오류
+# 대신 seat_taken 이 된다.
+_BOOK_SQL = """
+    WITH flight AS (
+        SELECT fid, plane, sched_dept FROM Flight WHERE fid = %(fid)s
+    ), seat AS (
+        SELECT s.sid, s.class
+        FROM Seat s JOIN flight f ON s.plane = f.plane
+        WHERE s.row = %(row)s AND s.letter = %(letter)s
+    ), price AS (
+        SELECT fp.price
+        FROM FlightPrice fp JOIN seat s ON fp.class = s.class
+        WHERE fp.fid = %(fid)s
+    ), verdict AS (
+        SELECT CASE
+            WHEN NOT EXISTS (SELECT 1 FROM Passenger WHERE pid = %(pid)s)
+                THEN 'no_passenger'
+            WHEN NOT EXISTS (SELECT 1 FROM flight) THEN 'no_flight'
+            WHEN %(ts)s > (SELECT sched_dept FROM flight) - INTERVAL '1 hour'
+                THEN 'too_late'
+            WHEN NOT EXISTS (SELECT 1 FROM seat) THEN 'no_seat'
+            WHEN EXISTS (
+                SELECT 1 FROM Booking b JOIN seat s ON b.seat = s.sid
+                WHERE b.flight = %(fid)s
+            ) THEN 'seat_taken'
+            WHEN NOT EXISTS (SELECT 1 FROM price) THEN 'no_price'
+            ELSE 'ok'
+        END AS outcome
+    ), booked AS (
+        INSERT INTO Booking (bid, passenger, seat, flight, price, date_time)
+        SELECT %(bid)s, %(pid)s, s.sid, %(fid)s, p.price, %(ts)s
+        FROM seat s, price p, verdict v
+        WHERE v.outcome = 'ok'
+        ON CONFLICT (seat, flight) DO NOTHING
+        RETURNING bid
+    )
+    SELECT CASE WHEN EXISTS (SELECT 1 FROM booked) THEN 'booked'
+                WHEN v.outcome = 'ok' THEN 'seat_taken'
+                ELSE v.outcome END
+    FROM verdict v
+"""
+
+# 여러 예약 요청을 한 번에 검증한다. 같은 좌석을 요청한 행이 여럿이면
+# 배치에서 가장 먼저 나온 요청(idx 가 가장 작은 것)만 남긴다.
+_BATCH_VALIDATE_SQL = """
+    WITH request(idx, pid, seat_row, seat_letter, fid, ts) AS (VALUES %s)
+    SELECT DISTINCT ON (f.fid, s.sid) r.idx, r.pid, s.sid, f.fid, fp.price,
+           r.ts
+    FROM request r
+    JOIN Passenger p ON p.pid = r.pid
+    JOIN Flight f ON f.fid = r.fid
+    JOIN Seat s ON s.plane = f.plane AND s.row = r.seat_row
+                   AND s.letter = r.seat_letter
+    JOIN FlightPrice fp ON fp.fid = f.fid AND fp.class = s.class
+    WHERE r.ts <= f.sched_dept - INTERVAL '1 hour'
+      AND NOT EXISTS (
+          SELECT 1 FROM Booking b WHERE b.flight = f.fid AND b.seat = s.sid
+      )
+    ORDER BY f.fid, s.sid, r.idx
+"""
+_BATCH_VALIDATE_TEMPLATE = "(%s, %s::int, %s::int, %s::bpchar, %s::int, " \
+                           "%s::timestamp)"
+
+_BATCH_INSERT_SQL = """
+    INSERT INTO Booking (bid, passenger, seat, flight, price, date_time)
+    VALUES %s
+    ON CONFLICT (seat, flight) DO NOTHING
+    RETURNING bid
+"""
+
+# Postgres INT 의 범위. 이 밖의 값은 _BATCH_VALIDATE_TEMPLATE 의 ::int 변환이
+# 실패해서 배치 전체를 깨뜨린다.
+_INT_MIN, _INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def _batch_row(idx: int, request) -> Optional[tuple]:
+    """Return the row of _BATCH_VALIDATE_SQL for <request>, the request at
+    index <idx> of a make_bookings batch, or None if it is malformed.
+
+    A request is malformed unless it is a (pid, (row, letter), fid,
+    timestamp) tuple whose pid, row and fid are ints in the range of INT,
+    whose letter is a single character and whose timestamp is a datetime.
+    Such a request can't be booked, and sending it would make the casts in
+    the query fail for every request in the batch.
+    """
+    try:
+        pid, (row_val, letter), fid, timestamp = request
+    except (TypeError, ValueError):
+        return None
+    for value in (pid, row_val, fid):
+        if (not isinstance(value, int) or isinstance(value, bool)
+                or not _INT_MIN <= value <= _INT_MAX):
+            return None
+    if not isinstance(letter, str) or len(letter) != 1 or letter == "\0":
+        return None
+    if not isinstance(timestamp, datetime):
+        return None
+    return idx, pid, row_val, letter, fid, timestamp
+
+# find_unreachable_from 은 RouteGraph 를 쓰지만, 그래프가 없는 클라이언트
+# (AsyncAirTravel)는 이 재귀 쿼리로 같은 답을 구한다.
+_UNREACHABLE_SQL = """
+    WITH RECURSIVE reachable(dest) AS (
+        SELECT destination FROM Route WHERE source = %(airport)s
+        UNION
+        SELECT r.destination FROM Route r JOIN reachable re
+            ON r.source = re.dest
+    )
+    SELECT code FROM Airport
+    WHERE code <> %(airport)s AND code NOT IN (SELECT dest FROM reachable)
+"""
+
+# 공항과 노선을 한 문장으로 읽어야 같은 스냅샷에서 나온다.
+_ROUTE_GRAPH_SQL = """
+    SELECT a.code, r.destination
+    FROM Airport a LEFT JOIN Route r ON r.source = a.code
+"""
+
+_PLANE_CAPACITY_SQL = """
+    SELECT class::text, capacity FROM PlaneCapacity WHERE plane = %(plane)s
+"""
+
+_SEAT_MAP_SQL = """
+    SELECT f.plane, s.row, s.letter, s.class::text, b.bid IS NOT NULL
+    FROM Flight f JOIN Seat s ON s.plane = f.plane
+    LEFT JOIN Booking b ON b.flight = f.fid AND b.seat = s.sid
+    WHERE f.fid = %(fid)s
+    ORDER BY s.row, s.letter
+"""
+
+_RESERVE_BIDS_SQL = \
+    "SELECT nextval('booking_bid_seq') FROM generate_series(1, %s)"
+
+# 참조 캐시로 항공편, 좌석, 가격을 이미 알고 있을 때의 예약. 바뀔 수 있는
+# 승객과 중복 예약만 DB 에서 확인한다.
+_BOOK_CACHED_SQL = """
+    WITH verdict AS (
+        SELECT CASE
+            WHEN NOT EXISTS (SELECT 1 FROM Passenger WHERE pid = %(pid)s)
+                THEN 'no_passenger'
+            WHEN EXISTS (
+                SELECT 1 FROM Booking
+                WHERE flight = %(fid)s AND seat = %(sid)s
+            ) THEN 'seat_taken'
+            ELSE 'ok'
+        END AS outcome
+    ), booked AS (
+        INSERT INTO Booking (bid, passenger, seat, flight, price, date_time)
+        SELECT %(bid)s, %(pid)s, %(sid)s, %(fid)s, %(price)s, %(ts)s
+        FROM verdict v
+        WHERE v.outcome = 'ok'
+        ON CONFLICT (seat, flight) DO NOTHING
+        RETURNING bid
+    )
+    SELECT CASE WHEN EXISTS (SELECT 1 FROM booked) THEN 'booked'
+                WHEN v.outcome = 'ok' THEN 'seat_taken'
+                ELSE v.outcome END
+    FROM verdict v
+"""
+
+_FLIGHT_INFO_SQL = """
+    SELECT f.plane, f.sched_dept, fp.class::text, fp.price
+    FROM Flight f LEFT JOIN FlightPrice fp ON fp.fid = f.fid
+    WHERE f.fid = %(fid)s
+"""
+
+_PLANE_SEATS_SQL = """
+    SELECT row, letter, sid, class::text FROM Seat WHERE plane = %(plane)s
+"""
+
+# q1, q4 요약 테이블의 갱신. ReportChange 에 기록된 항공편만 다시 계산하고,
+# 이전 값과의 차이를 RouteFullness 와 AirlineStats 에 더한다. 동시에 두
+# 번 갱신하면 차이가 두 번 더해지므로 advisory lock 으로 막는다.
+_REPORT_REFRESH_LOCK_SQL = \
+    "SELECT pg_advisory_xact_lock(hashtext('airtravel_reports'))"
+
+_REPORT_DIRTY_SQL = """
+    CREATE TEMP TABLE report_dirty ON COMMIT DROP AS
+    WITH done AS (DELETE FROM ReportChange RETURNING fid)
+    SELECT DISTINCT fid FROM done
+"""
+
+_REPORT_RESET_SQL = """
+    TRUNCATE FlightStats, RouteFullness, AirlineStats;
+    TRUNCATE report_dirty;
+    INSERT INTO report_dirty SELECT fid FROM Flight;
+"""
+
+# 각 항공편의 수치. {flights} 는 대상 fid 에 대한 조건이며, q1 과 q4 의 전체
+# 재계산도 같은 정의를 쓴다. 예약은 항공편마다 따로 세지 않고 한 번에
+# 묶어서 센다. Booking (flight) 인덱스가 없어도 한 번만 읽으면 된다.
+_FLIGHT_STATS_SQL = """
+    SELECT f.fid, f.route, r.airline,
+           CASE WHEN d.fid IS NOT NULL AND c.capacity > 0
+                THEN fullness_bucket(COALESCE(b.bookings, 0), c.capacity)
+           END AS fullness,
+           a.date_time - f.sched_arrival AS delay,
+           COALESCE(b.first_sum, 0) AS first_sum,
+           COALESCE(b.first_count, 0) AS first_count,
+           COALESCE(b.business_sum, 0) AS business_sum,
+           COALESCE(b.business_count, 0) AS business_count,
+           COALESCE(b.economy_sum, 0) AS economy_sum,
+           COALESCE(b.economy_count, 0) AS economy_count
+    FROM Flight f
+    JOIN Route r ON r.flight_num = f.route
+    LEFT JOIN Departure d ON d.fid = f.fid
+    LEFT JOIN Arrival a ON a.fid = f.fid
+    LEFT JOIN (
+        SELECT plane, SUM(capacity) AS capacity FROM PlaneCapacity
+        GROUP BY plane
+    ) c ON c.plane = f.plane
+    LEFT JOIN (
+        SELECT bk.flight, COUNT(*) AS bookings,
+               SUM(bk.price::float8) FILTER (WHERE s.class = 'first')
+                   AS first_sum,
+               COUNT(*) FILTER (WHERE s.class = 'first') AS first_count,
+               SUM(bk.price::float8) FILTER (WHERE s.class = 'business')
+                   AS business_sum,
+               COUNT(*) FILTER (WHERE s.class = 'business')
+                   AS business_count,
+               SUM(bk.price::float8) FILTER (WHERE s.class = 'economy')
+                   AS economy_sum,
+               COUNT(*) FILTER (WHERE s.class = 'economy') AS economy_count
+        FROM Booking bk JOIN Seat s ON s.sid = bk.seat
+        WHERE bk.flight {flights}
+        GROUP BY bk.flight
+    ) b ON b.flight = f.fid
+    WHERE f.fid {flights}
+"""
+
+_ALL_FLIGHT_STATS_SQL = _FLIGHT_STATS_SQL.format(flights="IS NOT NULL")
+
+_REPORT_UPDATE_SQL = """
+    CREATE TEMP TABLE report_old ON COMMIT DROP AS
+    SELECT fs.* FROM FlightStats fs JOIN report_dirty USING (fid);
+    DELETE FROM FlightStats fs USING report_dirty d WHERE fs.fid = d.fid;
+    INSERT INTO FlightStats
+    """ + _FLIGHT_STATS_SQL.format(
+        flights="IN (SELECT fid FROM report_dirty)") + """;
+
+    WITH delta AS (
+        SELECT fs.route, fs.fullness, 1 AS sign
+        FROM FlightStats fs JOIN report_dirty USING (fid)
+        UNION ALL
+        SELECT route, fullness, -1 FROM report_old
+    )
+    INSERT INTO RouteFullness AS rf
+    SELECT route,
+           COALESCE(SUM(sign) FILTER (WHERE fullness = 'very_low'), 0),
+           COALESCE(SUM(sign) FILTER (WHERE fullness = 'low'), 0),
+           COALESCE(SUM(sign) FILTER (WHERE fullness = 'fair'), 0),
+           COALESCE(SUM(sign) FILTER (WHERE fullness = 'normal'), 0),
+           COALESCE(SUM(sign) FILTER (WHERE fullness = 'high'), 0)
+    FROM delta WHERE fullness IS NOT NULL GROUP BY route
+    ON CONFLICT (route) DO UPDATE SET
+        very_low = rf.very_low + EXCLUDED.very_low,
+        low = rf.low + EXCLUDED.low,
+        fair = rf.fair + EXCLUDED.fair,
+        normal = rf.normal + EXCLUDED.normal,
+        high = rf.high + EXCLUDED.high;
+
+    WITH delta AS (
+        SELECT fs.*, 1 AS sign
+        FROM FlightStats fs JOIN report_dirty USING (fid)
+        UNION ALL
+        SELECT *, -1 FROM report_old
+    )
+    INSERT INTO AirlineStats AS st
+    SELECT airline, SUM(sign),
+           COALESCE(SUM(sign * delay), INTERVAL '0'),
+           COALESCE(SUM(sign) FILTER (WHERE delay IS NOT NULL), 0),
+           SUM(sign * first_sum), SUM(sign * first_count),
+           SUM(sign * business_sum), SUM(sign * business_count),
+           SUM(sign * economy_sum), SUM(sign * economy_count)
+    FROM delta GROUP BY airline
+    ON CONFLICT (airline) DO UPDATE SET
+        flights = st.flights + EXCLUDED.flights,
+        delay_sum = st.delay_sum + EXCLUDED.delay_sum,
+        delay_count = st.delay_count + EXCLUDED.delay_count,
+        first_sum = st.first_sum + EXCLUDED.first_sum,
+        first_count = st.first_count + EXCLUDED.first_count,
+        business_sum = st.business_sum + EXCLUDED.business_sum,
+        business_count = st.business_count + EXCLUDED.business_count,
+        economy_sum = st.economy_sum + EXCLUDED.economy_sum,
+        economy_count = st.economy_count + EXCLUDED.economy_count;
+"""
+
+_Q1_SUMMARY_SQL = """
+    SELECT r.airline, r.flight_num, COALESCE(rf.very_low, 0),
+           COALESCE(rf.low, 0), COALESCE(rf.fair, 0),
+           COALESCE(rf.normal, 0), COALESCE(rf.high, 0)
+    FROM Route r LEFT JOIN RouteFullness rf ON rf.route = r.flight_num
+    ORDER BY r.airline, r.flight_num
+"""
+
+_Q1_FULL_SQL = """
+    WITH stats AS (""" + _ALL_FLIGHT_STATS_SQL + """)
+    SELECT r.airline, r.flight_num,
+           COUNT(*) FILTER (WHERE s.fullness = 'very_low'),
+           COUNT(*) FILTER (WHERE s.fullness = 'low'),
+           COUNT(*) FILTER (WHERE s.fullness = 'fair'),
+           COUNT(*) FILTER (WHERE s.fullness = 'normal'),
+           COUNT(*) FILTER (WHERE s.fullness = 'high')
+    FROM Route r LEFT JOIN stats s ON s.route = r.flight_num
+    GROUP BY r.airline, r.flight_num
+    ORDER BY r.airline, r.flight_num
+"""
+
+# q4 의 평균은 합계와 개수로 계산해서, 요약과 전체 재계산이 같은 식을 쓴다.
+_Q4_TOTALS_SQL = """
+    SELECT a.code AS airline,
+           (SELECT COUNT(*) FROM Plane p WHERE p.airline = a.code)
+               AS num_planes,
+           (SELECT COUNT(*) FROM Route r WHERE r.airline = a.code)
+               AS num_routes,
+           COALESCE(st.flights, 0) AS flights, st.delay_sum, st.delay_count,
+           st.first_sum, st.first_count, st.business_sum,
+           st.business_count, st.economy_sum, st.economy_count
+    FROM Airline a LEFT JOIN {} st ON st.airline = a.code
+"""
+
+_Q4_AVERAGES_SQL = """
+    SELECT airline, num_planes, num_routes,
+           (flights::float8 / NULLIF(num_routes, 0))::real,
+           delay_sum / NULLIF(delay_count, 0),
+           (first_sum / NULLIF(first_count, 0))::real,
+           (business_sum / NULLIF(business_count, 0))::real,
+           (economy_sum / NULLIF(economy_count, 0))::real
+    FROM ({}) totals
+    ORDER BY airline
+"""
+
+_Q4_SUMMARY_SQL = _Q4_AVERAGES_SQL.format(
+    _Q4_TOTALS_SQL.format("AirlineStats"))
+
+_Q4_FULL_SQL = _Q4_AVERAGES_SQL.format(_Q4_TOTALS_SQL.format("""(
+    SELECT airline, COUNT(*) AS flights,
+           SUM(delay) AS delay_sum, COUNT(delay) AS delay_count,
+           SUM(first_sum) AS first_sum, SUM(first_count) AS first_count,
+           SUM(business_sum) AS business_sum,
+           SUM(business_count) AS business_count,
+           SUM(economy_sum) AS economy_sum,
+           SUM(economy_count) AS economy_count
+    FROM (""" + _ALL_FLIGHT_STATS_SQL + """) s
+    GROUP BY airline
+)"""))
+
+# 다시 시도하면 성공할 수 있는 오류: serialization_failure, deadlock_detected.
+_RETRYABLE_PGCODES = ("40001", "40P01")
+
+# setup() 이 스키마를 다시 만들 때마다 증가한다. 이전 스키마에서 얻은 상태
+# (예: 미리 예약해 둔 bid)를 버려야 하는지 판단하는 데 쓴다.
+_setup_generation = 0
+
+
+class BidAllocator:
+    """Hands out new booking ids, reserving them from the booking_bid_seq
+    sequence in blocks so that most bookings don't need a round trip for
+    their id.
+
+    Ids handed out by one allocator are strictly increasing, and no two
+    allocators (in any process) ever hand out the same id. Ids of bookings
+    that were rejected are not reused, so the bids in Booking may have gaps.
+
+    === Instance Attributes ===
+    block_size: the number of ids reserved from the sequence at a time.
+    """
+    block_size: int
+    _reserved: deque[int]
+    _generation: int
+    _lock: threading.Lock
+
+    def __init__(self, block_size: int = 64) -> None:
+        """Initialize this allocator with no ids reserved yet."""
+        self.block_size = block_size
+        self._reserved = deque()
+        self._generation = _setup_generation
+        self._lock = threading.Lock()
+
+    def allocate(self, cursor: pg_ext.cursor) -> int:
+        """Return a new booking id, reserving another block of ids using
+        <cursor> if all reserved ids have been used.
+        """
+        return self.allocate_many(cursor, 1)[0]
+
+    def allocate_many(self, cursor: pg_ext.cursor, n: int) -> list[int]:
+        """Return <n> new booking ids in increasing order, reserving more ids
+        using <cursor> if fewer than <n> are left.
+        """
+        with self._lock:
+            bids = self._take(n)
+            if bids is None:
+                cursor.execute(_RESERVE_BIDS_SQL, (self._shortfall(n),))
+                self._reserved.extend(
+                    sorted(row[0] for row in cursor.fetchall()))
+                bids = self._take(n)
+            return bids
+
+    def _take(self, n: int) -> Optional[list[int]]:
+        """Return the next <n> reserved ids, or None if fewer than <n> are
+        reserved. Drop ids reserved before the last setup() first.
+        """
+        if self._generation != _setup_generation:
+            self._reserved.clear()
+            self._generation = _setup_generation
+        if len(self._reserved) < n:
+            return None
+        return [self._reserved.popleft() for _ in range(n)]
+
+    def _shortfall(self, n: int) -> int:
+        """Return how many ids to reserve so that at least <n> are
+        available.
+        """
+        return max(self.block_size, n - len(self._reserved))
+
+
+class RouteGraph:
+    """An in-memory index of which airports can be reached from which, built
+    from the Airport and Route relations.
+
+    Airports that can reach each other (a strongly connected component of
+    the route graph) can reach exactly the same airports, so reachability is
+    computed once per component, over the graph of components.
+
+    === Instance Attributes ===
+    airports: the IATA codes of all airports, in index order.
+    """
+    airports: list[str]
+    _index: dict[str, int]
+    _component: list[int]
+    _reach: list[int]
+    _answers: dict[int, list[str]]
+
+    def __init__(self, airports: Iterable[str],
+                 routes: Iterable[tuple[str, str]]) -> None:
+        """Initialize this graph with the airports <airports> and the routes
+        <routes>, given as (source, destination) pairs of IATA codes.
+        """
+        self.airports = list(airports)
+        self._index = {code: i for i, code in enumerate(self.airports)}
+        adjacency = [[] for _ in self.airports]
+        for source, destination in routes:
+            adjacency[self._index[source]].append(self._index[destination])
+        self._component, members = self._components(adjacency)
+
+        # Tarjan 알고리즘은 컴포넌트를 역위상 순서로 내놓으므로, 앞에서부터
+        # 채우면 후속 컴포넌트의 결과가 항상 먼저 준비되어 있다.
+        self._reach = []
+        for c, nodes in enumerate(members):
+            mask = 0
+            for node in nodes:
+                mask |= 1 << node
+                for succ in adjacency[node]:
+                    d = self._component[succ]
+                    if d != c:
+                        mask |= self._reach[d]
+            self._reach.append(mask)
+        self._answers = {}
+
+    def unreachable_from(self, airport: str) -> Optional[list[str]]:
+        """Return the IATA codes of the airports that are not reachable from
+        <airport>, not including <airport>, or None if <airport> is not the
+        code of an airport in this graph.
+        """
+        node = self._index.get(airport)
+        if node is None:
+            return None
+        c = self._component[node]
+        if c not in self._answers:
+            unreachable = ~self._reach[c]
+            self._answers[c] = [code for i, code in enumerate(self.airports)
+                                if unreachable >> i & 1]
+        # 같은 컴포넌트 안의 공항은 서로 도달 가능하므로 결과에 없다.
+        return list(self._answers[c])
+
+    def unreachable_matrix(self) -> dict[str, list[str]]:
+        """Return a dictionary that maps the IATA code of each airport to
+        unreachable_from(code).
+        """
+        return {code: self.unreachable_from(code) for code in self.airports}
+
+    @staticmethod
+    def _components(adjacency: list[list[int]]
+                    ) -> tuple[list[int], list[list[int]]]:
+        """Return the strongly connected component of each node of the graph
+        <adjacency> and the nodes of each component, with components
+        numbered in reverse topological order (Tarjan's algorithm).
+        """
+        n = len(adjacency)
+        order, low = [-1] * n, [0] * n
+        component = [-1] * n
+        members = []
+        stack, counter = [], 0
+        for root in range(n):
+            if order[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                node, i = work.pop()
+                if i == 0:
+                    order[node] = low[node] = counter
+                    counter += 1
+                    stack.append(node)
+                if i < len(adjacency[node]):
+                    work.append((node, i + 1))
+                    succ = adjacency[node][i]
+                    if order[succ] == -1:
+                        work.append((succ, 0))
+                    elif component[succ] == -1:
+                        low[node] = min(low[node], order[succ])
+                    continue
+                if low[node] == order[node]:
+                    nodes = []
+                    while True:
+                        top = stack.pop()
+                        component[top] = len(members)
+                        nodes.append(top)
+                        if top == node:
+                            break
+                    members.append(nodes)
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+        return component, members
+
+
+class SeatMap:
+    """The seats of the plane used by a flight, and which of them are booked,
+    kept as a bitmap indexed by the position of each seat.
+
+    === Instance Attributes ===
+    seats: the (row, letter, class) of every seat, ordered by row and
+        letter.
+    taken: the bitmap of booked seats; bit i is set iff seats[i] is booked.
+    """
+    seats: list[tuple[int, str, str]]
+    taken: int
+    _index: dict[tuple[int, str], int]
+
+    def __init__(self, seats: list[tuple[int, str, str]],
+                 taken: list[bool]) -> None:
+        """Initialize this seat map with the seats <seats>, where <taken>
+        says, for each of them, whether it is booked.
+        """
+        self.seats = seats
+        self._index = {(row, letter): i
+                       for i, (row, letter, _) in enumerate(seats)}
+        self.taken = 0
+        for i, booked in enumerate(taken):
+            self.taken |= booked << i
+
+    def is_taken(self, seat: tuple[int, str]) -> bool:
+        """Return whether <seat>, a (row, letter) tuple, is a booked seat."""
+        i = self._index.get(tuple(seat))
+        return i is not None and bool(self.taken >> i & 1)
+
+    def mark_taken(self, seat: tuple[int, str]) -> None:
+        """Record that <seat>, a (row, letter) tuple, is booked."""
+        i = self._index.get(tuple(seat))
+        if i is not None:
+            self.taken |= 1 << i
+
+
+class LRUCache:
+    """A mapping of bounded size whose entries expire, evicting the least
+    recently used entry when it is full. It is safe to use from several
+    threads.
+
+    === Instance Attributes ===
+    maxsize: the largest number of entries kept.
+    ttl: the number of seconds an entry is kept after it is stored, or None
+        to keep entries until they are evicted or invalidated.
+    hits: the number of lookups that found a live entry.
+    misses: the number of lookups that didn't, including expired entries.
+    evictions: the number of entries evicted to make room.
+    """
+    maxsize: int
+    ttl: Optional[float]
+    hits: int
+    misses: int
+    evictions: int
+    _entries: OrderedDict
+    _lock: threading.Lock
+
+    def __init__(self, maxsize: int = 10000,
+                 ttl: Optional[float] = 60.0) -> None:
+        """Initialize an empty cache of at most <maxsize> entries, each kept
+        for <ttl> seconds.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value stored for <key>, or <default> if there is none
+        or it has expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None
+                                      or entry[1] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value) -> None:
+        """Store <value> for <key>."""
+        expiry = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expiry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, match: Optional[Callable] = None) -> None:
+        """Drop the entries whose key satisfies <match>, or every entry if
+        <match> is None.
+        """
+        with self._lock:
+            if match is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if match(key)]:
+                del self._entries[key]
+
+    def stats(self) -> dict[str, float]:
+        """Return the hits, misses, hit rate, evictions and size of this
+        cache.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "evictions": self.evictions, "size": len(self._entries)}
+
+
+# reassign_plane 이 읽는 데이터. 날짜 인자는 ::date 로 캐스팅해 두어
+# psycopg2 와 asyncpg 양쪽에서 그대로 쓸 수 있게 한다.
+_REASSIGN_TARGETS_SQL = """
+    SELECT f.fid, f.sched_dept, f.sched_arrival, p.airline
+    FROM Flight f JOIN Plane p ON p.tail_number = f.plane
+    WHERE f.plane = ANY(%(planes)s)
+      AND f.sched_dept >= %(start)s::date
+      AND f.sched_dept < %(end)s::date + 1
+    ORDER BY f.sched_dept, f.fid
+"""
+
+_REASSIGN_FLEET_SQL = """
+    SELECT p.airline, p.tail_number, pc.class::text, pc.capacity
+    FROM Plane p LEFT JOIN PlaneCapacity pc ON pc.plane = p.tail_number
+    WHERE p.airline IN (
+        SELECT airline FROM Plane WHERE tail_number = ANY(%(planes)s)
+    )
+"""
+
+_REASSIGN_SCHEDULE_SQL = """
+    SELECT f.plane, f.sched_dept, f.sched_arrival
+    FROM Flight f JOIN Plane p ON p.tail_number = f.plane
+    WHERE p.airline IN (
+        SELECT airline FROM Plane WHERE tail_number = ANY(%(planes)s)
+    )
+      AND f.sched_arrival > %(window_start)s
+      AND f.sched_dept < %(window_end)s
+"""
+
+_REASSIGN_DEMAND_SQL = """
+    SELECT b.flight, s.class::text, COUNT(*)
+    FROM Booking b JOIN Seat s ON b.seat = s.sid
+    WHERE b.flight = ANY(%(fids)s)
+    GROUP BY b.flight, s.class
+"""
+
+_REASSIGN_UPDATE_SQL = """
+    UPDATE Flight AS f SET plane = v.plane
+    FROM unnest(%(fids)s::int[], %(tails)s::text[]) AS v(fid, plane)
+    WHERE f.fid = v.fid
+"""
+
+# 재배정할 항공편의 앞뒤로 비어 있어야 하는 시간.
+_TURNAROUND = timedelta(hours=2)
+
+
+class FleetSchedule:
+    """The scheduled flights of a set of planes, indexed by plane and
+    departure time, used to find planes that are free around a flight.
+
+    Assumes that no plane has overlapping flights, so that the flights of a
+    plane sorted by departure are also sorted by arrival.
+    """
+    _departures: dict[str, list[datetime]]
+    _arrivals: dict[str, list[datetime]]
+
+    def __init__(self, flights: Iterable[tuple[str, datetime, datetime]]
+                 ) -> None:
+        """Initialize this schedule with <flights>, given as (plane,
+        departure, arrival) tuples.
+        """
+        self._departures = {}
+        self._arrivals = {}
+        for plane, dept, arrival in sorted(flights, key=lambda f: f[1]):
+            self._departures.setdefault(plane, []).append(dept)
+            self._arrivals.setdefault(plane, []).append(arrival)
+
+    def is_free(self, plane: str, dept: datetime, arrival: datetime) -> bool:
+        """Return whether <plane> has no flight in the open interval from
+        <_TURNAROUND> before <dept> to <_TURNAROUND> after <arrival>.
+        """
+        departures = self._departures.get(plane)
+        if not departures:
+            return True
+        # 구간 끝보다 먼저 출발하는 항공편 중 마지막 것만 확인하면 된다.
+        i = bisect_left(departures, arrival + _TURNAROUND)
+        return i == 0 or self._arrivals[plane][i - 1] <= dept - _TURNAROUND
+
+    def add(self, plane: str, dept: datetime, arrival: datetime) -> None:
+        """Record that <plane> flies from <dept> to <arrival>."""
+        departures = self._departures.setdefault(plane, [])
+        i = bisect(departures, dept)
+        departures.insert(i, dept)
+        self._arrivals.setdefault(plane, []).insert(i, arrival)
+
+
+def _reassign_window(targets: list[tuple], start: date,
+                     end: date) -> dict[str, datetime]:
+    """Return the window_start and window_end parameters of
+    _REASSIGN_SCHEDULE_SQL: the interval that covers every day from <start>
+    to <end> and every flight in <targets>, widened by the turnaround.
+    """
+    first = datetime.combine(start, datetime.min.time())
+    last = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    return {
+        "window_start": min(first, min(t[1] for t in targets)) - _TURNAROUND,
+        "window_end": max(last, max(t[2] for t in targets)) + _TURNAROUND,
+    }
+
+
+def _plan_reassignment(
+        targets: list[tuple], fleet: list[tuple], schedule: list[tuple],
+        demand: list[tuple], grounded: set[str], start: date, end: date
+) -> tuple[list[tuple[int, str]], list[int]]:
+    """Pick a replacement plane for each flight in <targets>, as described
+    in AirTravel.reassign_plane, without touching the database.
+
+    <targets> are the (fid, departure, arrival, airline) rows of
+    _REASSIGN_TARGETS_SQL, in order of departure; <fleet>, <schedule> and
+    <demand> are the rows of the other _REASSIGN_*_SQL queries. Planes in
+    <grounded> are never picked.
+
+    Return the (fid, plane) pairs of the flights that were reassigned, and
+    the ids of the flights that were not. Each choice takes into account the
+    flights reassigned before it, whichever grounded plane they came from.
+    """
+    capacity: dict[str, dict[str, int]] = {}
+    candidates: dict[str, list[str]] = {}
+    for airline, plane, seat_class, count in fleet:
+        if plane not in capacity:
+            capacity[plane] = {}
+            if plane not in grounded:
+                candidates.setdefault(airline, []).append(plane)
+        if seat_class is not None:
+            capacity[plane][seat_class] = count
+    needed: dict[int, dict[str, int]] = {}
+    for fid, seat_class, count in demand:
+        needed.setdefault(fid, {})[seat_class] = count
+
+    first = datetime.combine(start, datetime.min.time())
+    last = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    trips = Counter(plane for plane, dept, _ in schedule
+                    if first <= dept < last)
+    index = FleetSchedule(schedule)
+    # 항공사별 후보를 (운항 수, tail_number) 순으로 유지해서, 조건을 만족하는
+    # 첫 비행기가 곧 우선순위가 가장 높은 비행기가 되게 한다.
+    ranked = {airline: sorted((trips[plane], plane) for plane in planes)
+              for airline, planes in candidates.items()}
+
+    updates, unscheduled = [], []
+    for fid, dept, arrival, airline in targets:
+        seats = needed.get(fid, {})
+        order = ranked.get(airline, [])
+        for i, (count, plane) in enumerate(order):
+            if all(capacity[plane].get(seat_class, 0) >= needed_count
+                   for seat_class, needed_count in seats.items()) \
+                    and index.is_free(plane, dept, arrival):
+                break
+        else:
+            unscheduled.append(fid)
+            continue
+        updates.append((fid, plane))
+        index.add(plane, dept, arrival)
+        del order[i]
+        insort(order, (count + 1, plane))
+    return updates, unscheduled
+
+
+def _open_connection(dbname: str, username: str,
+                     password: str) -> pg_ext.connection:
+    """Return a new connection to the database <dbname> using the username
+    <username> and password <password>, with the search path set to
+    AirTravel and the client encoding set to UTF8.
+    """
+    connection = pg.connect(
+        dbname=dbname, user=username, password=password,
+        options="-c search_path=AirTravel"
+    )
+    connection.set_client_encoding("UTF8")
+    return connection
+
+
+class ConnectionPool:
+    """A bounded pool of connections to an A2 database that can be shared by
+    several threads.
+
+    Connections are opened lazily, up to <maxconn> of them, and are set up
+    (search path and encoding) only once, when they are opened. A thread
+    that asks for a connection while all of them are in use waits until
+    one is returned, for at most <timeout> seconds.
+
+    Before a connection that has been idle for more than <health_interval>
+    seconds is handed out, it is checked with a trivial query, and it is
+    replaced if the check fails.
+
+    === Instance Attributes ===
+    maxconn: the maximum number of connections that can be open at once.
+    timeout: the longest a thread waits for a connection, in seconds, or
+        None to wait forever.
+    health_interval: how long a connection can be idle before it is checked
+        again, in seconds.
+    """
+    maxconn: int
+    timeout: Optional[float]
+    health_interval: float
+    _credentials: tuple[str, str, str]
+    _configure: Optional[Callable[[pg_ext.connection], None]]
+    _idle: list[tuple[pg_ext.connection, float]]
+    _in_use: dict[int, float]
+    _opened: int
+    _cond: threading.Condition
+    _created_at: float
+    _closed: bool
+    _metrics: dict[str, float]
+
+    def __init__(self, dbname: str, username: str, password: str,
+                 minconn: int = 1, maxconn: int = 10,
+                 timeout: Optional[float] = 30.0,
+                 health_interval: float = 30.0,
+                 configure: Optional[Callable[[pg_ext.connection], None]]
+                 = None) -> None:
+        """Initialize this pool for the database <dbname>, opening <minconn>
+        connections right away. If <configure> is given, it is called with
+        every connection the pool opens, right after it is opened.
+
+        Raise pg.Error if any of these connections can't be made.
+        """
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self._credentials = (dbname, username, password)
+        self._configure = configure
+        self._idle = []
+        self._in_use = {}
+        self._opened = 0
+        self._cond = threading.Condition()
+        self._created_at = time.monotonic()
+        self._closed = False
+        self._metrics = {
+            "checkouts": 0, "waits": 0, "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0, "busy_seconds": 0.0, "timeouts": 0,
+            "discarded": 0,
+        }
+        try:
+            for _ in range(min(minconn, maxconn)):
+                self._idle.append((self._open(), time.monotonic()))
+                self._opened += 1
+        except pg.Error:
+            self.closeall()
+            raise
+
+    def getconn(self) -> pg_ext.connection:
+        """Return a connection for the exclusive use of the caller until it
+        is given back with putconn().
+
+        Raise pg_pool.PoolError if no connection became available within
+        <self.timeout> seconds, and pg.Error if a new connection can't be
+        made.
+        """
+        begin = time.monotonic()
+        waited = discarded = False
+        with self._cond:
+            while not self._idle and self._opened >= self.maxconn:
+                if self._closed:
+                    raise pg_pool.PoolError("the pool is closed")
+                remaining = None
+                if self.timeout is not None:
+                    remaining = self.timeout - (time.monotonic() - begin)
+                    if remaining <= 0:
+                        self._metrics["timeouts"] += 1
+                        raise pg_pool.PoolError(
+                            "no connection available in the pool")
+                waited = True
+                self._cond.wait(remaining)
+            if self._closed:
+                raise pg_pool.PoolError("the pool is closed")
+            if self._idle:
+                connection, idle_since = self._idle.pop()
+            else:
+                connection, idle_since = None, None
+                # 자리를 미리 잡아 두고, 연결은 락 밖에서 연다.
+                self._opened += 1
+
+        try:
+            if connection is not None and not self._healthy(connection,
+                                                            idle_since):
+                discarded = True
+                self._close(connection)
+                connection = None
+            if connection is None:
+                connection = self._open()
+        except pg.Error:
+            with self._cond:
+                self._metrics["discarded"] += discarded
+                self._opened -= 1
+                self._cond.notify()
+            raise
+
+        now = time.monotonic()
+        with self._cond:
+            self._metrics["checkouts"] += 1
+            self._metrics["discarded"] += discarded
+            self._metrics["waits"] += waited
+            self._metrics["wait_seconds"] += now - begin
+            self._metrics["max_wait_seconds"] = max(
+                self._metrics["max_wait_seconds"], now - begin)
+            self._in_use[id(connection)] = now
+        return connection
+
+    def putconn(self, connection: pg_ext.connection) -> None:
+        """Give back <connection>, which was returned by getconn(). Any
+        transaction left open on it is rolled back, and it is closed instead
+        of being reused if it is broken.
+        """
+        broken = connection.closed != 0
+        if not broken:
+            try:
+                status = connection.info.transaction_status
+                if status == pg_ext.TRANSACTION_STATUS_UNKNOWN:
+                    broken = True
+                elif status != pg_ext.TRANSACTION_STATUS_IDLE:
+                    connection.rollback()
+            except pg.Error:
+                broken = True
+
+        now = time.monotonic()
+        with self._cond:
+            checked_out = self._in_use.pop(id(connection), now)
+            self._metrics["busy_seconds"] += now - checked_out
+            self._metrics["discarded"] += broken
+            keep = not broken and not self._closed
+            if keep:
+                self._idle.append((connection, now))
+            else:
+                self._opened -= 1
+            self._cond.notify()
+        if not keep:
+            self._close(connection)
+
+    @contextmanager
+    def connection(self) -> Iterator[pg_ext.connection]:
+        """Check out a connection for the duration of a with block."""
+        connection = self.getconn()
+        try:
+            yield connection
+        finally:
+            self.putconn(connection)
+
+    def closeall(self) -> None:
+        """Close every idle connection in this pool, and stop handing out
+        connections. Connections that are in use are closed when they are
+        given back.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._opened -= len(idle)
+            self._closed = True
+            self._cond.notify_all()
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self) -> dict[str, float]:
+        """Return the metrics of this pool: the number of checkouts, how many
+        of them had to wait and for how long in total and at most (in
+        seconds), how many timed out, how many broken connections were
+        discarded, the number of open and in-use connections, and the
+        utilization, i.e., the fraction of the pool's capacity that has been
+        in use since it was created.
+        """
+        now = time.monotonic()
+        with self._cond:
+            stats = dict(self._metrics)
+            busy = stats["busy_seconds"] + sum(
+                now - since for since in self._in_use.values())
+            stats["open"] = self._opened
+            stats["in_use"] = len(self._in_use)
+            capacity = max(self.maxconn, 1) * (now - self._created_at)
+            stats["utilization"] = busy / capacity if capacity else 0.0
+        return stats
+
+    def _open(self) -> pg_ext.connection:
+        """Open and configure a new connection for this pool."""
+        connection = _open_connection(*self._credentials)
+        if self._configure is not None:
+            try:
+                self._configure(connection)
+            except pg.Error:
+                self._close(connection)
+                raise
+        return connection
+
+    def _healthy(self, connection: pg_ext.connection,
+                 idle_since: float) -> bool:
+        """Return whether <connection>, idle since <idle_since>, can still be
+        used, checking it with a trivial query if it has been idle for too
+        long.
+        """
+        if connection.closed:
+            return False
+        if time.monotonic() - idle_since < self.health_interval:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            connection.rollback()
+            return True
+        except pg.Error:
+            return False
+
+    @staticmethod
+    def _close(connection: pg_ext.connection) -> None:
+        """Close <connection>, ignoring any error."""
+        try:
+            connection.close()
+        except pg.Error:
+            pass
+
+
+class LatencyHistogram:
+    """A histogram of durations, with fixed buckets in milliseconds.
+
+    === Instance Attributes ===
+    counts: the number of durations in each bucket: counts[i] is the number
+        of durations of at most BOUNDS_MS[i] milliseconds (and more than
+        BOUNDS_MS[i - 1]), and counts[-1] the number of longer ones.
+    count: the number of durations added.
+    total_seconds: the sum of the durations added.
+    """
+    BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000,
+                 2500, 10000)
+    counts: list[int]
+    count: int
+    total_seconds: float
+
+    def __init__(self) -> None:
+        """Initialize an empty histogram."""
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total_seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        """Add a duration of <seconds> to this histogram."""
+        self.counts[bisect_left(self.BOUNDS_MS, seconds * 1000)] += 1
+        self.count += 1
+        self.total_seconds += seconds
+
+    def as_dict(self) -> dict:
+        """Return this histogram as a dictionary that can be serialized."""
+        return {"bounds_ms": list(self.BOUNDS_MS), "counts": list(self.counts),
+                "count": self.count, "total_ms": self.total_seconds * 1000}
+
+
+class InstrumentedCursor(pg_ext.cursor):
+    """A cursor that reports the duration, row count and error (if any) of
+    every statement it executes to <instrumentation>.
+
+    Instrumentation.cursor_factory is a subclass with <instrumentation> set,
+    which is what connections should be given as their cursor_factory.
+    """
+    instrumentation: "Instrumentation"
+
+    def execute(self, query, vars=None):
+        """Execute <query> with <vars>, and report it."""
+        begin = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception as ex:
+            self.instrumentation.record_statement(
+                query, time.perf_counter() - begin, 0, ex)
+            raise
+        self.instrumentation.record_statement(
+            query, time.perf_counter() - begin, max(self.rowcount, 0))
+        return result
+
+
+# 계측 결과에서 문장을 알아보기 쉽도록, 알려진 문장에는 이름을 붙인다.
+# 키는 _statement_head 의 결과라서 execute_values 가 값을 채워 넣은 문장도
+# 같은 이름이 된다.
+def _statement_head(query) -> str:
+    """Return the start of <query>, with its whitespace collapsed. For
+    PREPARE and EXECUTE, return only the verb and the statement's name.
+    """
+    if isinstance(query, bytes):
+        query = query[:200].decode("utf-8", "replace")
+    head = " ".join(query[:200].split())
+    if head.startswith(("PREPARE ", "EXECUTE ")):
+        return " ".join(head.split(" ", 2)[:2])
+    return head[:60]
+
+
+_STATEMENT_NAMES = {_statement_head(sql): name for sql, name in [
+    (_BOOK_SQL, "book"),
+    (_BATCH_VALIDATE_SQL, "batch validate"),
+    (_BATCH_INSERT_SQL, "batch insert"),
+    (_UNREACHABLE_SQL, "unreachable"),
+    (_ROUTE_GRAPH_SQL, "route graph"),
+    (_PLANE_CAPACITY_SQL, "plane capacity"),
+    (_SEAT_MAP_SQL, "seat map"),
+    (_RESERVE_BIDS_SQL, "reserve bids"),
+    (_BOOK_CACHED_SQL, "book cached"),
+    (_FLIGHT_INFO_SQL, "flight info"),
+    (_PLANE_SEATS_SQL, "plane seats"),
+    (_REPORT_DIRTY_SQL, "report changes"),
+    (_REPORT_UPDATE_SQL, "report update"),
+    (_Q1_SUMMARY_SQL, "q1 summary"),
+    (_Q4_SUMMARY_SQL, "q4 summary"),
+    (_REASSIGN_TARGETS_SQL, "reassign targets"),
+    (_REASSIGN_FLEET_SQL, "reassign fleet"),
+    (_REASSIGN_SCHEDULE_SQL, "reassign schedule"),
+    (_REASSIGN_DEMAND_SQL, "reassign demand"),
+    (_REASSIGN_UPDATE_SQL, "reassign update"),
+]}
+
+
+@lru_cache(maxsize=None)
+def _numbered(sql: str) -> tuple[str, tuple[str, ...]]:
+    """Return <sql> with its %(name)s placeholders replaced by the $n
+    placeholders used by PREPARE (and asyncpg), and the names in the order
+    of n.
+    """
+    names = []
+
+    def number(match: re.Match) -> str:
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    return re.sub(r"%\((\w+)\)s", number, sql), tuple(names)
+
+
+# make_booking, plane_capacity, seat_map, reassign_plane 이 매번 보내는 문장.
+# 연결마다 처음 쓸 때 PREPARE 해 두고, 그 뒤로는 EXECUTE 로 실행해서 파싱과
+# 계획을 반복하지 않는다.
+_PREPARED_SQL = [
+    (_BOOK_SQL, "book"),
+    (_BOOK_CACHED_SQL, "book cached"),
+    (_FLIGHT_INFO_SQL, "flight info"),
+    (_PLANE_SEATS_SQL, "plane seats"),
+    (_PLANE_CAPACITY_SQL, "plane capacity"),
+    (_SEAT_MAP_SQL, "seat map"),
+    (_REASSIGN_TARGETS_SQL, "reassign targets"),
+    (_REASSIGN_FLEET_SQL, "reassign fleet"),
+    (_REASSIGN_SCHEDULE_SQL, "reassign schedule"),
+    (_REASSIGN_DEMAND_SQL, "reassign demand"),
+    (_REASSIGN_UPDATE_SQL, "reassign update"),
+]
+_STATEMENT_NAMES.update({
+    f"EXECUTE airtravel_{name.replace(' ', '_')}": name
+    for _, name in _PREPARED_SQL
+})
+
+# 준비해 둔 문장이 없어졌거나(invalid_sql_statement_name), 결과 형식이 바뀌어
+# 쓸 수 없게 되었거나(feature_not_supported), 모르는 사이에 이미 준비된 경우
+# (duplicate_prepared_statement). 모두 비우고 다시 PREPARE 하면 된다.
+_REPREPARE_PGCODES = ("26000", "0A000", "42P05")
+
+
+class PreparedStatements:
+    """The fixed statements that AirTravel prepares on each connection it
+    uses, so that Postgres parses them once per connection instead of on
+    every call, and can reuse their plans.
+
+    A statement is prepared on a connection the first time it is executed
+    there, so a new connection (after connect(), or a new one in the pool)
+    prepares its own. Statements prepared before the last setup() are
+    deallocated and prepared again. If executing a prepared statement fails
+    because it is missing or stale, the connection is forgotten, so that the
+    next attempt prepares everything again.
+    """
+    _statements: dict[str, tuple[str, str, tuple[str, ...]]]
+    _prepared: weakref.WeakKeyDictionary
+    _lock: threading.Lock
+
+    def __init__(self, statements: Iterable[tuple[str, str]] = _PREPARED_SQL
+                 ) -> None:
+        """Initialize this registry with the (sql, name) pairs of the
+        <statements> to prepare, and nothing prepared yet.
+        """
+        self._statements = {}
+        for sql, name in statements:
+            text, params = _numbered(sql)
+            self._statements[sql] = (f"airtravel_{name.replace(' ', '_')}",
+                                     text, params)
+        self._prepared = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def execute(self, cursor: pg_ext.cursor, sql: str, params: dict) -> None:
+        """Execute <sql> with <params> using <cursor>, as a prepared
+        statement if <sql> is one of the statements of this registry.
+        """
+        statement = self._statements.get(sql)
+        if statement is None:
+            cursor.execute(sql, params)
+            return
+        name, text, names = statement
+        connection = cursor.connection
+        with self._lock:
+            generation, prepared = self._prepared.get(connection, (None, None))
+            if generation != _setup_generation:
+                prepared = set()
+                self._prepared[connection] = (_setup_generation, prepared)
+        if generation is not None and generation != _setup_generation:
+            cursor.execute("DEALLOCATE ALL")
+        try:
+            # PREPARE 는 트랜잭션이 롤백되어도 연결이 끊길 때까지 남는다.
+            if name not in prepared:
+                cursor.execute(f"PREPARE {name} AS {text}")
+                prepared.add(name)
+            cursor.execute(
+                f"EXECUTE {name} ({', '.join(['%s'] * len(names))})",
+                [params[param] for param in names])
+        except pg.Error as ex:
+            if ex.pgcode in _REPREPARE_PGCODES:
+                self.forget(connection)
+            raise
+
+    def forget(self, connection: pg_ext.connection) -> None:
+        """Forget what was prepared on <connection>, and deallocate all of it
+        there before the next statement is prepared.
+        """
+        with self._lock:
+            if connection in self._prepared:
+                self._prepared[connection] = (-1, set())
+
+
+class Instrumentation:
+    """Counters, latency histograms and an optional per-call trace of the
+    work an AirTravel instance does, for instances whose <instrumentation>
+    attribute is set to it.
+
+    For each public method call, the method's latency and round trips (the
+    statements it executed) are recorded, and for make_booking, the outcome:
+    "booked", one of the rejection reasons returned by AirTravel._book,
+    "known_taken" if the seat was rejected from the seat map cache,
+    "no_connection", or "error". For each statement, its latency and rows
+    are recorded, and its errors are counted by exception class (e.g.
+    DeadlockDetected), so that failures can be told apart from rejections.
+
+    === Instance Attributes ===
+    cursor_factory: the cursor class that reports to this instance.
+    trace: the most recent calls, as dictionaries, if this instance was
+        created with a trace size; empty otherwise.
+    on_call: a function called with the dictionary of every call as it
+        completes, or None.
+    """
+    cursor_factory: type
+    trace: deque
+    on_call: Optional[Callable[[dict], None]]
+    _lock: threading.Lock
+    _local: threading.local
+    _calls: dict[str, LatencyHistogram]
+    _round_trips: Counter
+    _outcomes: dict[str, Counter]
+    _statements: dict[str, LatencyHistogram]
+    _rows: Counter
+    _errors: Counter
+
+    def __init__(self, trace_size: int = 0,
+                 on_call: Optional[Callable[[dict], None]] = None,
+                 cursor_class: type = pg_ext.cursor) -> None:
+        """Initialize this instance with no calls recorded, keeping the last
+        <trace_size> calls in <trace> and passing each call to <on_call>.
+        Cursors are instances of <cursor_class>, wrapped to report to this
+        instance.
+        """
+        self.cursor_factory = type("InstrumentedCursor",
+                                   (InstrumentedCursor, cursor_class),
+                                   {"instrumentation": self})
+        self.trace = deque(maxlen=trace_size)
+        self.on_call = on_call
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.trace.clear()
+            self._calls = {}
+            self._round_trips = Counter()
+            self._outcomes = {}
+            self._statements = {}
+            self._rows = Counter()
+            self._errors = Counter()
+
+    @contextmanager
+    def call(self, method: str) -> Iterator[None]:
+        """Record a call to the method <method> made inside this context by
+        the current thread.
+        """
+        detailed = self.trace.maxlen or self.on_call is not None
+        record = {"method": method, "round_trips": 0, "outcome": None,
+                  "error": None, "statements": [] if detailed else None}
+        stack = self._local.__dict__.setdefault("calls", [])
+        stack.append(record)
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["seconds"] = time.perf_counter() - begin
+            stack.pop()
+            with self._lock:
+                self._calls.setdefault(method, LatencyHistogram()).add(
+                    record["seconds"])
+                self._round_trips[method] += record["round_trips"]
+                if record["outcome"] is not None:
+                    self._outcomes.setdefault(method, Counter())[
+                        record["outcome"]] += 1
+                if detailed:
+                    self.trace.append(record)
+            if self.on_call is not None:
+                self.on_call(record)
+
+    def _current(self) -> Optional[dict]:
+        """Return the record of the innermost call of the current thread, or
+        None if it is not inside a call.
+        """
+        stack = self._local.__dict__.get("calls")
+        return stack[-1] if stack else None
+
+    def record_statement(self, query, seconds: float, rows: int,
+                         error: Optional[Exception] = None) -> None:
+        """Record that <query> took <seconds> and returned or changed <rows>
+        rows, or failed with <error>.
+        """
+        head = _statement_head(query)
+        name = _STATEMENT_NAMES.get(head, head)
+        with self._lock:
+            self._statements.setdefault(name, LatencyHistogram()).add(seconds)
+            self._rows[name] += rows
+            if error is not None:
+                self._errors[type(error).__name__] += 1
+        record = self._current()
+        if record is not None:
+            record["round_trips"] += 1
+            if error is not None:
+                record["error"] = type(error).__name__
+            if record["statements"] is not None:
+                record["statements"].append((name, seconds, rows))
+
+    def record_outcome(self, outcome: str) -> None:
+        """Record <outcome> as the outcome of the current call."""
+        record = self._current()
+        if record is not None:
+            record["outcome"] = outcome
+
+    def snapshot(self) -> dict:
+        """Return everything recorded so far as a dictionary that can be
+        serialized: for each method, its latency histogram, round trips and
+        outcomes; for each statement, its latency histogram and rows; and the
+        number of statement errors of each exception class.
+        """
+        with self._lock:
+            return {
+                "calls": {method: {"latency": histogram.as_dict(),
+                                   "round_trips": self._round_trips[method],
+                                   "outcomes": dict(self._outcomes.get(
+                                       method, {}))}
+                          for method, histogram in self._calls.items()},
+                "statements": {name: {"latency": histogram.as_dict(),
+                                      "rows": self._rows[name]}
+                               for name, histogram in self._statements.items()},
+                "errors": dict(self._errors),
+            }
+
+
+def _instrumented(method: Callable) -> Callable:
+    """Return <method>, an AirTravel method, recording each call in the
+    instance's <instrumentation> if it has one.
+    """
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return method(self, *args, **kwargs)
+        with instrumentation.call(name):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class ReportStream:
+    """An iterator over the rows of a server-side cursor, made by
+    AirTravel.stream_report, that gives the cursor's connection back once
+    the rows are all read or it is closed. It can also be used as a context
+    manager, which closes it on exit.
+    """
+    _rows: Optional[Iterator[tuple]]
+    _stack: ExitStack
+
+    def __init__(self, cursor: pg_ext.cursor, stack: ExitStack) -> None:
+        """Initialize this iterator over the rows of <cursor>, closing
+        <stack> when it is done.
+        """
+        self._rows = iter(cursor)
+        self._stack = stack
+
+    def __iter__(self) -> "ReportStream":
+        return self
+
+    def __next__(self) -> tuple:
+        if self._rows is None:
+            raise StopIteration
+        try:
+            return next(self._rows)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self) -> "ReportStream":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop reading rows, and give the connection back."""
+        if self._rows is not None:
+            self._rows = None
+            self._stack.close()
 
 
 class AirTravel:
@@ -31,18 +1510,65 @@ class AirTravel:
     === Instance Attributes ===
     connection: connection to a PostgreSQL database of Markus-related
         information.
+    pool: the pool of connections used instead of <connection>, if this
+        instance was connected with connect_pool().
+    bids: the allocator that new booking ids are taken from.
+    route_graph: the in-memory index of airports and routes used by
+        find_unreachable_from, or None if it must be (re)built.
+    capacities: the seat capacity of each plane looked up so far, by
+        tail number and then class.
+    seat_maps: the seat maps of the (at most 1000) flights most recently
+        read by seat_map(), by flight id, kept up to date with the bookings
+        made by this instance.
+    instrumentation: where the calls to this instance's methods and the
+        statements they execute are recorded, or None to record nothing.
+    booking_retries: how many more times a booking is attempted after it
+        fails with a serialization failure or a deadlock.
+    flight_cache: the plane and scheduled departure of flights, by flight
+        id, or None if reference caching is off (see cache_references).
+    seat_cache: the sid and class of seats, by (plane, row, letter), or
+        None if reference caching is off.
+    price_cache: the FlightPrice prices, by (flight id, class), or None if
+        reference caching is off.
+    statements: the statements prepared on this instance's connections, or
+        None to send every statement as plain SQL.
 
     Representation invariants:
     - The database to which <connection> holds a reference conforms to the
       schema used in A2.
+    - At most one of <connection> and <pool> is not None.
     """
     connection: Optional[pg_ext.connection]
+    pool: Optional[ConnectionPool]
+    bids: BidAllocator
+    route_graph: Optional[RouteGraph]
+    capacities: dict[str, dict[str, int]]
+    seat_maps: LRUCache
+    instrumentation: Optional[Instrumentation]
+    booking_retries: int
+    flight_cache: Optional[LRUCache]
+    seat_cache: Optional[LRUCache]
+    price_cache: Optional[LRUCache]
+    statements: Optional[PreparedStatements]
+    _cache_lock: threading.RLock
+    _cache_generation: int
 
     def __init__(self) -> None:
         """Initialize this VetClinic instance, with no database connection
         yet.
         """
         self.connection = None
+        self.pool = None
+        self.bids = BidAllocator()
+        self.route_graph = None
+        self.capacities = {}
+        self.seat_maps = LRUCache(1000, ttl=None)
+        self.instrumentation = None
+        self.booking_retries = 3
+        self.flight_cache = self.seat_cache = self.price_cache = None
+        self.statements = PreparedStatements()
+        self._cache_lock = threading.RLock()
+        self._cache_generation = _setup_generation
 
     def connect(self, dbname: str, username: str, password: str) -> bool:
         """Establish a connection to the database <dbname> using the
@@ -63,11 +1589,27 @@ class AirTravel:
         False
         """
         try:
-            self.connection = pg.connect(
-                dbname=dbname, user=username, password=password,
-                options="-c search_path=AirTravel"
-            )
-            self.connection.set_client_encoding("UTF8")
+            self.connection = _open_connection(dbname, username, password)
+            self._configure(self.connection)
+            return True
+        except pg.Error:
+            return False
+
+    def connect_pool(self, dbname: str, username: str, password: str,
+                     minconn: int = 1, maxconn: int = 10,
+                     timeout: Optional[float] = 30.0) -> bool:
+        """Like connect(), but back this instance with a ConnectionPool of at
+        most <maxconn> connections instead of a single connection, so that
+        several threads can call its methods at the same time. A call that
+        can't get a connection within <timeout> seconds fails the same way
+        as it would without a connection.
+
+        Return True if the pool was created successfully, False otherwise.
+        """
+        try:
+            self.pool = ConnectionPool(dbname, username, password,
+                                       minconn, maxconn, timeout,
+                                       configure=self._configure)
             return True
         except pg.Error:
             return False
@@ -89,17 +1631,250 @@ class AirTravel:
         try:
             if self.connection and not self.connection.closed:
                 self.connection.close()
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
             return True
         except pg.Error:
             return False
 
+    def _configure(self, connection: pg_ext.connection) -> None:
+        """Prepare the newly opened <connection> for use by this instance:
+        subscribe it to the change notifications sent by the triggers in
+        the schema, and drop the caches, which may have missed changes made
+        while it was not listening.
+        """
+        cursor = connection.cursor()
+        cursor.execute("LISTEN airtravel_changed")
+        cursor.close()
+        connection.commit()
+        self.invalidate_caches()
+
+    def invalidate_caches(self, table: Optional[str] = None) -> None:
+        """Drop the in-memory data derived from the relation <table>, or from
+        every relation if <table> is None. This is done automatically when
+        a change is notified by the database, so it only needs to be called
+        after changes made with the triggers disabled.
+        """
+        with self._cache_lock:
+            if table in (None, "route", "airport"):
+                self.route_graph = None
+            if table in (None, "seat"):
+                self.capacities = {}
+            if table in (None, "seat", "flight", "booking"):
+                self.seat_maps.invalidate()
+            references = {"flight": self.flight_cache,
+                          "seat": self.seat_cache,
+                          "flightprice": self.price_cache}
+            for name, cache in references.items():
+                if cache is not None and table in (None, name):
+                    cache.invalidate()
+
+    def cache_references(self, maxsize: Optional[int] = 10000,
+                         ttl: Optional[float] = 60.0) -> None:
+        """Turn on caching of the flight, seat and price rows make_booking
+        reads, keeping at most <maxsize> entries of each kind for <ttl>
+        seconds (or until they are evicted). Turn it off if <maxsize> is
+        None.
+
+        Cached rows are dropped when the database notifies a change to their
+        relation, and can be dropped explicitly with invalidate_flight, or
+        invalidate_caches after changes made with the triggers disabled.
+        <ttl> bounds how long a change that is not notified can go unseen.
+        """
+        with self._cache_lock:
+            if maxsize is None:
+                self.flight_cache = self.seat_cache = self.price_cache = None
+            else:
+                self.flight_cache = LRUCache(maxsize, ttl)
+                self.seat_cache = LRUCache(maxsize, ttl)
+                self.price_cache = LRUCache(maxsize, ttl)
+
+    def invalidate_flight(self, fid: int) -> None:
+        """Drop the cached plane, departure and prices of the flight <fid>,
+        e.g. after its plane or prices were changed.
+        """
+        with self._cache_lock:
+            if self.flight_cache is not None:
+                self.flight_cache.invalidate(lambda key: key == fid)
+            if self.price_cache is not None:
+                self.price_cache.invalidate(lambda key: key[0] == fid)
+
+    def cache_stats(self) -> dict[str, dict[str, float]]:
+        """Return the statistics of each reference cache, by name, or an
+        empty dictionary if reference caching is off.
+        """
+        caches = {"flight": self.flight_cache, "seat": self.seat_cache,
+                  "price": self.price_cache}
+        return {name: cache.stats() for name, cache in caches.items()
+                if cache is not None}
+
+    def _drain_notifications(self, connection: pg_ext.connection) -> None:
+        """Process the change notifications that have arrived on
+        <connection>, dropping the caches they make stale. Drop every cache
+        if setup() has reloaded the schema since they were filled.
+        """
+        with self._cache_lock:
+            if self._cache_generation != _setup_generation:
+                self.invalidate_caches()
+                self._cache_generation = _setup_generation
+        connection.poll()
+        while connection.notifies:
+            notify = connection.notifies.pop(0)
+            self.invalidate_caches(notify.payload)
+
+    def _route_graph(self, connection: pg_ext.connection) -> RouteGraph:
+        """Return the route graph for the database, building it with
+        <connection> if it is missing or stale.
+        """
+        self._drain_notifications(connection)
+        with self._cache_lock:
+            graph = self.route_graph
+            if graph is None:
+                cursor = connection.cursor()
+                cursor.execute(_ROUTE_GRAPH_SQL)
+                rows = cursor.fetchall()
+                cursor.close()
+                connection.rollback()
+                graph = RouteGraph(
+                    dict.fromkeys(row[0] for row in rows),
+                    [row for row in rows if row[1] is not None]
+                )
+                self.route_graph = graph
+        return graph
+
+    @_instrumented
+    def plane_capacity(self, tail_number: str) -> Optional[dict[str, int]]:
+        """Return the number of seats of each class on the plane identified
+        by <tail_number>, e.g. {"first": 12, "economy": 150}. Classes the
+        plane has no seats of are left out, so the result is empty if there
+        is no such plane.
+
+        The capacity is read from PlaneCapacity, which the database keeps
+        up to date, and cached until Seat changes.
+
+        Return None if the capacity can't be read i.e., your method should
+        NOT throw an exception.
+        """
+        with self._session() as connection:
+            if connection is None:
+                return None
+            try:
+                self._drain_notifications(connection)
+                with self._cache_lock:
+                    if tail_number in self.capacities:
+                        return dict(self.capacities[tail_number])
+                cursor = connection.cursor()
+                self._execute(cursor, _PLANE_CAPACITY_SQL,
+                              {"plane": tail_number})
+                capacity = dict(cursor.fetchall())
+                cursor.close()
+                connection.rollback()
+                with self._cache_lock:
+                    self.capacities[tail_number] = capacity
+                return dict(capacity)
+            except Exception:
+                connection.rollback()
+                return None
+
+    @_instrumented
+    def seat_map(self, fid: int) -> Optional[list[tuple[int, str, str, bool]]]:
+        """Return every seat of the plane used by the flight <fid>, as
+        (row, letter, class, taken) tuples ordered by row and letter, where
+        <taken> is whether the seat is booked on <fid>.
+
+        The seats are read with one query, and the result is also kept in
+        <self.seat_maps> so that make_booking can reject seats that are
+        already booked without asking the database.
+
+        Return None if <fid> is invalid or the seats can't be read i.e.,
+        your method should NOT throw an exception.
+        """
+        with self._session() as connection:
+            if connection is None:
+                return None
+            try:
+                self._drain_notifications(connection)
+                cursor = connection.cursor()
+                self._execute(cursor, _SEAT_MAP_SQL, {"fid": fid})
+                rows = cursor.fetchall()
+                cursor.close()
+                connection.rollback()
+            except Exception:
+                connection.rollback()
+                return None
+        if not rows:
+            return None
+        seat_map = SeatMap([row[1:4] for row in rows],
+                           [row[4] for row in rows])
+        with self._cache_lock:
+            self.seat_maps.put(fid, seat_map)
+        return [row[1:] for row in rows]
+
+    def _seat_known_taken(self, fid: int, seat: tuple[int, str]) -> bool:
+        """Return whether <seat> is known to be booked on the flight <fid>
+        according to <self.seat_maps>.
+        """
+        with self._cache_lock:
+            seat_map = self.seat_maps.get(fid)
+            return seat_map is not None and seat_map.is_taken(seat)
+
+    def _mark_seat_taken(self, fid: int, seat: tuple[int, str]) -> None:
+        """Record in <self.seat_maps> that <seat> is booked on the flight
+        <fid>, if the seat map of <fid> is cached.
+        """
+        with self._cache_lock:
+            seat_map = self.seat_maps.get(fid)
+            if seat_map is not None:
+                seat_map.mark_taken(seat)
+
+    @contextmanager
+    def _session(self) -> Iterator[Optional[pg_ext.connection]]:
+        """Provide the connection to use for one method call: a connection
+        checked out of <self.pool> if there is one, and <self.connection>
+        otherwise. Provide None if there is no connection to use.
+
+        The connection's cursors report to <self.instrumentation>, if set.
+        """
+        if self.pool is None:
+            connection = self.connection
+        else:
+            try:
+                connection = self.pool.getconn()
+            except pg.Error:
+                yield None
+                return
+        if connection is not None:
+            connection.cursor_factory = (
+                None if self.instrumentation is None
+                else self.instrumentation.cursor_factory)
+        if self.pool is None:
+            yield connection
+            return
+        try:
+            yield connection
+        finally:
+            self.pool.putconn(connection)
+
+    def _execute(self, cursor: pg_ext.cursor, sql: str, params: dict) -> None:
+        """Execute <sql> with <params> using <cursor>, through
+        <self.statements> if it is set.
+        """
+        if self.statements is None:
+            cursor.execute(sql, params)
+        else:
+            self.statements.execute(cursor, sql, params)
+
+    @_instrumented
     def make_booking(self, pid, seat, fid, timestamp):
         """Create a booking for the passenger identified by <pid> for the
         flight identified by <fid>. <seat> is a tuple of the row and letter of
         the seat selected by the passenger. <timestamp> is the timestamp of the
         booking.
 
-        Set the booking's bid to be the maximum current existing bid + 1.
+        Set the booking's bid to the next id handed out by <self.bids>,
+        which is larger than any bid loaded by setup() and than any bid
+        <self.bids> handed out before.
         Set the price paid by the passenger to be the current price recorded
         in FlightPrice for the seating class for <seat>.
 
@@ -114,85 +1889,233 @@ class AirTravel:
             * <timestamp> is later than 1 hour before <fid>'s scheduled
               departure.
         """
-        # TODO: Write the function definition according to the defined criteria
-        if self.connection is None:
-            return False
+        outcome = self._booking_outcome(pid, seat, fid, timestamp,
+                                        use_seat_maps=True)
+        return outcome == "booked"
+
+    @_instrumented
+    def book(self, pid, seat, fid, timestamp) -> str:
+        """Create a booking exactly like make_booking, but return why it was
+        or wasn't made: "booked" if it was made, "seat_taken" if <seat> is
+        already booked on <fid> (including by a concurrent booking that got
+        there first), "no_passenger", "no_flight", "too_late", "no_seat" or
+        "no_price" if it breaks one of the rules of make_booking, and
+        "error" if it couldn't be made at all, e.g. because the connection
+        failed. Your method should NOT throw an exception.
+
+        The rules are checked in the order above, by the database: unlike
+        make_booking, a seat known from a cached seat map to be taken is not
+        rejected before the other rules are checked.
+        """
+        outcome = self._booking_outcome(pid, seat, fid, timestamp,
+                                        use_seat_maps=False)
+        return "error" if outcome == "no_connection" else outcome
+
+    def _booking_outcome(self, pid, seat, fid, timestamp,
+                         use_seat_maps: bool) -> str:
+        """Perform make_booking with a connection of this instance, record
+        its outcome in <self.instrumentation>, and return it. Reject seats
+        known to be taken from <self.seat_maps> first iff <use_seat_maps>.
+        """
+        with self._session() as connection:
+            outcome = self._make_booking(connection, pid, seat, fid,
+                                         timestamp, use_seat_maps)
+        if self.instrumentation is not None:
+            self.instrumentation.record_outcome(outcome)
+        return outcome
+
+    def _make_booking(self, connection: Optional[pg_ext.connection], pid,
+                      seat, fid, timestamp,
+                      use_seat_maps: bool = True) -> str:
+        """Perform make_booking using <connection>, and return "booked" or
+        the reason the booking was not made: one of the reasons returned by
+        _book, "known_taken", "no_connection" or "error".
+
+        If <use_seat_maps> is True, a seat that <self.seat_maps> says is
+        taken is rejected as "known_taken" before anything else is checked,
+        so the reason may hide another rule the booking breaks; only the
+        fact that it was rejected is reliable then.
+
+        A booking that fails with a serialization failure or a deadlock is
+        rolled back and attempted again, up to <self.booking_retries> more
+        times, after a short random pause. So is one whose prepared
+        statement was lost, which is prepared again.
+        """
+        if connection is None:
+            return "no_connection"
         try:
-            cursor = self.connection.cursor()
-            # 1. 확인: Passenger 존재 여부
-            cursor.execute("SELECT 1 FROM Passenger WHERE passenger_id = %s", (pid,))
-            if cursor.fetchone() is None:
-                cursor.close()
-                return False
-
-            # 2. 확인: Flight 존재 및 scheduled_departure, plane_id (또는 tail_number) 가져오기
-            cursor.execute(
-                "SELECT scheduled_departure, tail_number FROM Flight WHERE flight_id = %s",
-                (fid,)
-            )
-            flight_row = cursor.fetchone()
-            if flight_row is None:
-                cursor.close()
-                return False
-            scheduled_departure, plane_identifier = flight_row
-
-            # 3. 예약 시각 검사: 예약 timestamp는 scheduled_departure 1시간 전보다 이전이어야 함.
-            if timestamp > (scheduled_departure - timedelta(hours=1)):
+            self._drain_notifications(connection)
+            # 이미 예약된 것으로 알고 있는 좌석은 DB 에 묻지 않고 거절한다.
+            if use_seat_maps and self._seat_known_taken(fid, seat):
+                return "known_taken"
+            cursor = connection.cursor()
+            bid = self.bids.allocate(cursor)
+            for attempt in range(self.booking_retries + 1):
+                try:
+                    outcome = None
+                    if self.flight_cache is not None:
+                        outcome = self._book_cached(cursor, bid, pid, seat,
+                                                    fid, timestamp)
+                    if outcome is None:
+                        outcome = self._book(cursor, bid, pid, seat, fid,
+                                             timestamp)
+                    connection.commit()
+                    break
+                except pg.Error as ex:
+                    connection.rollback()
+                    if (ex.pgcode not in _RETRYABLE_PGCODES
+                            + _REPREPARE_PGCODES
+                            or attempt == self.booking_retries):
+                        raise
+                    time.sleep(random.uniform(0, 0.005 * 2 ** attempt))
+            cursor.close()
+        except Exception:
+            outcome = "error"
+            connection.rollback()
+        if outcome in ("booked", "seat_taken"):
+            self._mark_seat_taken(fid, seat)
+        return outcome
+
+    @_instrumented
+    def make_bookings(self, requests) -> list[bool]:
+        """Make each booking in <requests>, an iterable of (pid, seat, fid,
+        timestamp) tuples in the form accepted by make_booking, and return a
+        list with one entry per request: True if that booking was made, and
+        False otherwise. Your method should NOT throw an exception.
+
+        A request is rejected for the same reasons as in make_booking. If
+        several requests in the batch ask for the same seat on the same
+        flight, only the earliest of them in <requests> is booked. A
+        malformed request (see _batch_row) is rejected in Python and not
+        sent, so it doesn't affect the other requests.
+
+        All requests are validated with one query and the bookings are
+        inserted with one statement, in one transaction. If the batch can't
+        be processed at all (e.g. the connection fails), every entry is False.
+        """
+        requests = list(requests)
+        results = [False] * len(requests)
+        rows = [row for row in map(_batch_row, range(len(requests)),
+                                   requests) if row is not None]
+        with self._session() as connection:
+            if connection is None or not rows:
+                return results
+
+            winners, bids, booked = [], [], set()
+            try:
+                cursor = connection.cursor()
+                winners = pg_extras.execute_values(
+                    cursor, _BATCH_VALIDATE_SQL, rows,
+                    template=_BATCH_VALIDATE_TEMPLATE, page_size=len(rows),
+                    fetch=True
+                )
+                winners.sort()
+                if winners:
+                    bids = self.bids.allocate_many(cursor, len(winners))
+                    # 검증과 삽입 사이에 다른 세션이 같은 좌석을 예약했다면
+                    # ON CONFLICT 로 그 행만 건너뛴다.
+                    inserted = pg_extras.execute_values(
+                        cursor, _BATCH_INSERT_SQL,
+                        [(bid, pid, sid, fid, price, ts) for bid,
+                         (_, pid, sid, fid, price, ts) in zip(bids, winners)],
+                        page_size=len(winners), fetch=True
+                    )
+                    booked = {row[0] for row in inserted}
+                connection.commit()
                 cursor.close()
-                return False
+            except Exception:
+                booked = set()
+                connection.rollback()
+
+            for bid, winner in zip(bids, winners):
+                if bid in booked:
+                    results[winner[0]] = True
+                    self._mark_seat_taken(winner[3], requests[winner[0]][1])
+            return results
+
+    def _book(self, cursor: pg_ext.cursor, bid: int, pid: int,
+              seat: tuple[int, str], fid: int, timestamp: datetime) -> str:
+        """Validate and insert the booking with id <bid> described by <pid>,
+        <seat>, <fid> and <timestamp> using <cursor>, in a single round trip.
+
+        Return "booked" if the booking was inserted, and otherwise the reason
+        it was rejected: one of "no_passenger", "no_flight", "too_late",
+        "no_seat", "seat_taken" or "no_price". The checks are applied in that
+        order. The caller is responsible for committing or rolling back.
+        """
+        row_val, letter = seat
+        self._execute(cursor, _BOOK_SQL, {
+            "bid": bid, "pid": pid, "fid": fid, "row": row_val, "letter": letter,
+            "ts": timestamp
+        })
+        return cursor.fetchone()[0]
+
+    def _book_cached(self, cursor: pg_ext.cursor, bid: int, pid: int,
+                     seat: tuple[int, str], fid: int,
+                     timestamp: datetime) -> Optional[str]:
+        """Like _book, but take the flight's plane and departure, the seat
+        and the price from the reference caches, filling them using <cursor>
+        on a miss, so that only the passenger and the seat being free are
+        checked by the database.
+
+        Return None, without changing anything, if the booking would be
+        rejected for a reason found in the caches (or could not be priced);
+        _book then finds the reason in the usual order.
+        """
+        if not isinstance(timestamp, datetime):
+            return None
+        flight = self.flight_cache.get(fid)
+        if flight is None:
+            flight = self._cache_flight(cursor, fid)
+            if flight is None:
+                return None
+        plane, sched_dept = flight
+        if timestamp > sched_dept - timedelta(hours=1):
+            return None
 
-            # 4. 좌석 확인: Seat 테이블에서 plane의 좌석 구성 확인 (가정: Plane 식별은 tail_number로)
-            row_val, letter = seat
-            cursor.execute(
-                "SELECT seat_class FROM Seat WHERE tail_number = %s AND row = %s AND letter = %s",
-                (plane_identifier, row_val, letter)
-            )
-            seat_info = cursor.fetchone()
+        row_val, letter = seat
+        seat_info = self.seat_cache.get((plane, row_val, letter))
+        if seat_info is None:
+            # 좌석은 비행기 단위로 한 번에 읽어 둔다.
+            self._execute(cursor, _PLANE_SEATS_SQL, {"plane": plane})
+            for seat_row, seat_letter, sid, seat_class in cursor.fetchall():
+                info = (sid, seat_class)
+                self.seat_cache.put((plane, seat_row, seat_letter), info)
+                if (seat_row, seat_letter) == (row_val, letter):
+                    seat_info = info
             if seat_info is None:
-                cursor.close()
-                return False
-            seat_class = seat_info[0]
-
-            # 5. 해당 항공편에 대해 해당 좌석이 이미 예약되었는지 검사
-            cursor.execute(
-                "SELECT 1 FROM Booking WHERE flight_id = %s AND row = %s AND seat_letter = %s",
-                (fid, row_val, letter)
-            )
-            if cursor.fetchone() is not None:
-                cursor.close()
-                return False
-
-            # 6. FlightPrice 테이블에서 해당 항공편, 좌석 클래스의 가격 조회
-            cursor.execute(
-                "SELECT price FROM FlightPrice WHERE flight_id = %s AND seat_class = %s",
-                (fid, seat_class)
-            )
-            price_info = cursor.fetchone()
-            if price_info is None:
-                cursor.close()
-                return False
-            price = price_info[0]
-
-            # 7. 새 예약 id(bid)를 max(bid) + 1 로 설정
-            cursor.execute("SELECT COALESCE(MAX(bid), 0) FROM Booking")
-            max_bid = cursor.fetchone()[0]
-            new_bid = max_bid + 1
-
-            # 8. Booking 삽입
-            cursor.execute(
-                "INSERT INTO Booking (bid, passenger_id, flight_id, row, seat_letter, booking_time, price) "
-                "VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (new_bid, pid, fid, row_val, letter, timestamp, price)
-            )
-            self.connection.commit()
-            cursor.close()
-            return True
-
-        except Exception:
-            if self.connection:
-                self.connection.rollback()
-            return False
+                return None
+        sid, seat_class = seat_info
 
+        price = self.price_cache.get((fid, seat_class))
+        if price is None and self._cache_flight(cursor, fid) == flight:
+            price = self.price_cache.get((fid, seat_class))
+        if price is None:
+            return None
+        self._execute(cursor, _BOOK_CACHED_SQL, {
+            "bid": bid, "pid": pid, "sid": sid, "fid": fid, "price": price,
+            "ts": timestamp
+        })
+        return cursor.fetchone()[0]
+
+    def _cache_flight(self, cursor: pg_ext.cursor,
+                      fid: int) -> Optional[tuple[str, datetime]]:
+        """Read the plane, scheduled departure and prices of the flight <fid>
+        into the reference caches using <cursor>, and return its plane and
+        scheduled departure, or None if there is no such flight.
+        """
+        self._execute(cursor, _FLIGHT_INFO_SQL, {"fid": fid})
+        rows = cursor.fetchall()
+        if not rows:
+            return None
+        flight = tuple(rows[0][:2])
+        self.flight_cache.put(fid, flight)
+        for _, _, seat_class, price in rows:
+            if seat_class is not None:
+                self.price_cache.put((fid, seat_class), price)
+        return flight
+
+    @_instrumented
     def find_unreachable_from(self, airport: str):
         """Return a list of unique airport IATA code(s) that are not
         reachable from the airport identified by the IATA code <airport>.
@@ -209,39 +2132,37 @@ class AirTravel:
         should NOT throw an exception.
         If <airport> is a valid IATA code, but is reachable from all airports,
         you should return an empty list.
+
+        The answer comes from <self.route_graph>, which is built from Airport
+        and Route on first use and rebuilt after either of them changes.
         """
-        # TODO: Write the function definition according to the defined criteria
-        # NOTE: Check the 'WITH RECURSIVE' clause of Postgres.
-        #       You do not have to necessarily use it but it can be helpful.
-        if self.connection is None:
-            return None
-        try:
-            cursor = self.connection.cursor()
-            # 유효한 공항 코드인지 확인
-            cursor.execute("SELECT 1 FROM Airport WHERE code = %s", (airport,))
-            if cursor.fetchone() is None:
-                cursor.close()
+        with self._session() as connection:
+            if connection is None:
+                return None
+            try:
+                return self._route_graph(connection).unreachable_from(airport)
+            except Exception:
+                connection.rollback()
                 return None
 
-            # WITH RECURSIVE를 이용하여 <airport>로부터 도달 가능한 공항들을 찾음
-            recursive_query = (
-                "WITH RECURSIVE reachable(dest) AS ("
-                "    SELECT destination FROM Route WHERE source = %s "
-                "    UNION "
-                "    SELECT r.destination FROM Route r JOIN reachable re ON r.source = re.dest"
-                ") "
-                "SELECT code FROM Airport WHERE code <> %s AND code NOT IN (SELECT dest FROM reachable)"
-            )
-            cursor.execute(recursive_query, (airport, airport))
-            results = cursor.fetchall()
-            cursor.close()
-            # results는 [(code,), ...] 형태이므로 list comprehension 사용
-            return [row[0] for row in results]
-        except Exception:
-            if self.connection:
-                self.connection.rollback()
-            return None
+    @_instrumented
+    def unreachable_matrix(self) -> Optional[dict[str, list[str]]]:
+        """Return a dictionary that maps the IATA code of every airport to
+        the list find_unreachable_from would return for it.
+
+        Return None if the data can't be read i.e., your method should NOT
+        throw an exception.
+        """
+        with self._session() as connection:
+            if connection is None:
+                return None
+            try:
+                return self._route_graph(connection).unreachable_matrix()
+            except Exception:
+                connection.rollback()
+                return None
 
+    @_instrumented
     def reassign_plane(self, tail_number: str, start: date, end: date):
         """Reassign planes to flights scheduled to depart between the
         <start> and <end> dates (inclusive), that are currently using the plane
@@ -290,94 +2211,249 @@ class AirTravel:
         method with dates in the past. You may assume however that the flights
         in the range from <start> to <end> have not departed.
         """
-        # TODO: Write the function definition according to the defined criteria
-        unscheduled = []
-        if self.connection is None:
-            return unscheduled
-        try:
-            cursor = self.connection.cursor()
-            # 1. 원래 plane의 항공사 조회 (Plane 테이블에서 tail_number 기준)
-            cursor.execute(
-                "SELECT airline FROM Plane WHERE tail_number = %s", (tail_number,)
-            )
-            orig = cursor.fetchone()
-            if orig is None:
+        return self._reassign_committed([tail_number], start, end)
+
+    @_instrumented
+    def reassign_planes(self, tail_numbers: Iterable[str], start: date,
+                        end: date) -> list[int]:
+        """Reassign the flights of all the planes <tail_numbers> scheduled
+        to depart between the <start> and <end> dates (inclusive), as if
+        they were all grounded at once, and return the ids of the flights
+        for which no replacement was found.
+
+        Replacements are picked as in reassign_plane, except that none of
+        <tail_numbers> is ever picked, and the flights of all the planes are
+        considered together, in order of departure. Unlike calling
+        reassign_plane once per plane, which serves every flight of the
+        first plane before any flight of the next, an earlier flight is
+        never left unscheduled because a later one took its replacement.
+        All the changes are made in one transaction.
+
+        Your method should NOT throw an error, and returns an empty list if
+        there is nothing to reassign or the reassignment fails.
+        """
+        return self._reassign_committed(list(dict.fromkeys(tail_numbers)),
+                                        start, end)
+
+    def _reassign_committed(self, tail_numbers: list[str], start: date,
+                            end: date) -> list[int]:
+        """Perform _reassign for <tail_numbers> from <start> to <end> in a
+        transaction of its own, and return the ids of the flights that were
+        not reassigned, or an empty list if it fails.
+        """
+        with self._session() as connection:
+            unscheduled = []
+            if connection is None:
+                return unscheduled
+            try:
+                cursor = connection.cursor()
+                unscheduled = self._reassign(cursor, tail_numbers, start, end)
+                connection.commit()
                 cursor.close()
+                # 알림을 기다리지 않고, 비행기가 바뀌었을 항공편을 바로 버린다.
+                self.invalidate_caches("flight")
                 return unscheduled
-            original_airline = orig[0]
-
-            # 2. 대상 항공편 조회: 지정 tail_number를 사용하며, scheduled_departure의 날짜가 start~end 사이인 항공편
-            cursor.execute(
-                "SELECT flight_id, scheduled_departure, scheduled_arrival "
-                "FROM Flight "
-                "WHERE tail_number = %s AND DATE(scheduled_departure) BETWEEN %s AND %s "
-                "ORDER BY scheduled_departure ASC",
-                (tail_number, start, end)
-            )
-            flights = cursor.fetchall()
-
-            for flight in flights:
-                fid, sched_dep, sched_arr = flight
-                # 3. 현재 항공편의 예약 건수를 좌석 클래스별로 집계
-                cursor.execute(
-                    "SELECT seat_class, COUNT(*) FROM Booking WHERE flight_id = %s GROUP BY seat_class",
-                    (fid,)
-                )
-                bookings = cursor.fetchall()
-                booking_counts = {cls: count for cls, count in bookings}
-
-                # 4. 후보 plane 선택
-                #    - 같은 항공사 소유, 다른 tail_number
-                #    - 해당 항공편의 안전 구간: (sched_dep - 2시간, sched_arr + 2시간)
-                interval_start = sched_dep - timedelta(hours=2)
-                interval_end = sched_arr + timedelta(hours=2)
-                # 후보 plane 중, 동일 시간대에 겹치는 항공편이 없는 plane 선택
-                candidate_query = (
-                    "SELECT p.tail_number FROM Plane p "
-                    "WHERE p.airline = %s AND p.tail_number <> %s "
-                    "AND NOT EXISTS ("
-                    "    SELECT 1 FROM Flight f "
-                    "    WHERE f.tail_number = p.tail_number "
-                    "      AND f.scheduled_departure < %s "
-                    "      AND f.scheduled_arrival > %s"
-                    ") "
-                    "ORDER BY p.tail_number ASC"
-                )
-                cursor.execute(candidate_query, (original_airline, tail_number, interval_end, interval_start))
-                candidate_planes = [row[0] for row in cursor.fetchall()]
-
-                replacement_found = False
-                for candidate in candidate_planes:
-                    # 5. 후보 plane의 좌석 용량 확인 (PlaneSeat 테이블 사용)
-                    #    가정: PlaneSeat 테이블은 각 plane의 (tail_number, seat_class, capacity)를 제공
-                    cursor.execute(
-                        "SELECT seat_class, capacity FROM PlaneSeat WHERE tail_number = %s",
-                        (candidate,)
-                    )
-                    capacities = {cls: cap for cls, cap in cursor.fetchall()}
-                    meets_capacity = True
-                    for seat_cls, needed in booking_counts.items():
-                        if capacities.get(seat_cls, 0) < needed:
-                            meets_capacity = False
-                            break
-                    if meets_capacity:
-                        # 후보 plane 만족 → 해당 Flight의 tail_number를 업데이트
-                        cursor.execute(
-                            "UPDATE Flight SET tail_number = %s WHERE flight_id = %s",
-                            (candidate, fid)
-                        )
-                        replacement_found = True
-                        break
-
-                if not replacement_found:
-                    unscheduled.append(fid)
-            self.connection.commit()
+            except Exception:
+                connection.rollback()
+                return []
+
+    def _reassign(self, cursor: pg_ext.cursor, tail_numbers: list[str],
+                  start: date, end: date) -> list[int]:
+        """Reassign the flights of the planes <tail_numbers> that depart
+        between <start> and <end> as described in reassign_plane, using
+        <cursor>, and return the ids of the flights that were not
+        reassigned. The caller is responsible for committing.
+
+        The schedule, seat capacities and bookings are loaded with a fixed
+        number of queries, the planes are picked in memory, and all changes
+        are written back with one statement.
+        """
+        params = {"planes": list(tail_numbers), "start": start, "end": end}
+        self._execute(cursor, _REASSIGN_TARGETS_SQL, params)
+        targets = cursor.fetchall()
+        if not targets:
+            return []
+        params.update(_reassign_window(targets, start, end))
+        self._execute(cursor, _REASSIGN_FLEET_SQL, params)
+        fleet = cursor.fetchall()
+        self._execute(cursor, _REASSIGN_SCHEDULE_SQL, params)
+        schedule = cursor.fetchall()
+        self._execute(cursor, _REASSIGN_DEMAND_SQL,
+                      {"fids": [target[0] for target in targets]})
+        demand = cursor.fetchall()
+
+        updates, unscheduled = _plan_reassignment(
+            targets, fleet, schedule, demand, set(tail_numbers), start, end)
+        if updates:
+            self._execute(cursor, _REASSIGN_UPDATE_SQL, {
+                "fids": [fid for fid, _ in updates],
+                "tails": [plane for _, plane in updates]
+            })
+        return unscheduled
+
+    @_instrumented
+    def stream_report(self, name: str, chunk_size: int = 10000,
+                      report_dir: str = ".") -> Optional[ReportStream]:
+        """Run the report <name> (e.g. "q1"), defined in <name>.sql in the
+        directory <report_dir>, and return an iterator over its rows.
+
+        Instead of inserting the rows into the report's table, the query of
+        its INSERT INTO statement is run through a server-side cursor, and
+        the rows are fetched <chunk_size> at a time as the iterator is
+        consumed, so memory use doesn't grow with the size of the report.
+        Everything the report file creates is rolled back once the iterator
+        is exhausted or closed.
+
+        The iterator holds a connection until then: on an instance that is
+        not backed by a pool, finish (or close) it before calling any other
+        method. The call recorded in <self.instrumentation> covers running
+        the report's query, not fetching its rows.
+
+        Return None if there is no such report or it can't be run i.e., your
+        method should NOT throw an exception. An error while the rows are
+        being fetched is raised by the iterator, so that a truncated export
+        can't pass for a complete one.
+        """
+        if not re.fullmatch(r"q\d+", name):
+            return None
+        stack = ExitStack()
+        try:
+            statements = _split_statements(
+                os.path.join(report_dir, f"{name}.sql"))
+            connection = stack.enter_context(self._session())
+            if connection is None:
+                stack.close()
+                return None
+            stack.callback(connection.rollback)
+            cursor = connection.cursor()
+            query = None
+            for statement in statements:
+                match = _REPORT_INSERT.match(statement)
+                if match and match.group(1).lower() == name:
+                    query = match.group(2)
+                else:
+                    cursor.execute(statement)
             cursor.close()
-            return unscheduled
+            if query is None:
+                stack.close()
+                return None
+            # 이름 있는 커서는 서버 쪽 커서라서 행을 itersize 개씩 가져온다.
+            cursor = connection.cursor(name=f"{name}_stream")
+            cursor.itersize = chunk_size
+            cursor.execute(query)
+            stack.callback(cursor.close)
         except Exception:
-            if self.connection:
-                self.connection.rollback()
-            return unscheduled
+            stack.close()
+            return None
+        return ReportStream(cursor, stack)
+
+    @_instrumented
+    def export_snapshot(self, path: str) -> Optional[dict[str, int]]:
+        """Write a columnar snapshot of Flight, Booking and FlightPrice (see
+        snapshot.py) into the directory <path>, and return the number of
+        rows of each table. Open it with snapshot.Snapshot to run the q1 and
+        q4 aggregates without querying the database.
+
+        Return None if the snapshot can't be written i.e., your method
+        should NOT throw an exception.
+        """
+        try:
+            # numpy 는 스냅샷을 쓸 때만 필요하다.
+            from snapshot import export_snapshot
+        except ImportError:
+            return None
+        with self._session() as connection:
+            if connection is None:
+                return None
+            try:
+                return export_snapshot(connection, path)
+            except Exception:
+                connection.rollback()
+                return None
+
+    @_instrumented
+    def refresh_reports(self, full: bool = False) -> Optional[int]:
+        """Bring the summary tables behind the q1 and q4 reports up to date
+        with the changes recorded since they were last refreshed, and return
+        the number of flights whose figures were recomputed. If <full> is
+        True, rebuild the summaries from scratch instead.
+
+        Only the flights recorded in ReportChange are recomputed, and their
+        old figures are replaced by the new ones in the per-route and
+        per-airline totals, so the cost depends on how much changed rather
+        than on how much history there is. Refreshes are serialized.
+
+        Return None if the summaries can't be refreshed i.e., your method
+        should NOT throw an exception.
+        """
+        with self._session() as connection:
+            if connection is None:
+                return None
+            try:
+                cursor = connection.cursor()
+                cursor.execute(_REPORT_REFRESH_LOCK_SQL)
+                cursor.execute(_REPORT_DIRTY_SQL)
+                cursor.execute("SELECT COUNT(*), COUNT(*) - COUNT(fid) "
+                               "FROM report_dirty")
+                count, everything = cursor.fetchone()
+                # fid 가 NULL 인 변경은 TRUNCATE 로, 모든 항공편이 대상이다.
+                if full or everything:
+                    cursor.execute(_REPORT_RESET_SQL)
+                    count = cursor.rowcount
+                if count:
+                    cursor.execute(_REPORT_UPDATE_SQL)
+                connection.commit()
+                cursor.close()
+                return count
+            except Exception:
+                connection.rollback()
+                return None
+
+    @_instrumented
+    def summary_report(self, name: str,
+                       full: bool = False) -> Optional[list[tuple]]:
+        """Return the rows of the report <name>, "q1" or "q4", as of the
+        last refresh_reports, ordered by airline (and flight number). If
+        <full> is True, compute them from the base relations instead, which
+        is what the summaries are checked against.
+
+        Return None if <name> is not one of these reports or the rows can't
+        be read i.e., your method should NOT throw an exception.
+        """
+        queries = {("q1", False): _Q1_SUMMARY_SQL, ("q1", True): _Q1_FULL_SQL,
+                   ("q4", False): _Q4_SUMMARY_SQL, ("q4", True): _Q4_FULL_SQL}
+        query = queries.get((name, bool(full)))
+        with self._session() as connection:
+            if connection is None or query is None:
+                return None
+            try:
+                cursor = connection.cursor()
+                cursor.execute(query)
+                rows = cursor.fetchall()
+                cursor.close()
+                connection.rollback()
+                return rows
+            except Exception:
+                connection.rollback()
+                return None
+
+
+def _split_statements(path: str) -> list[str]:
+    """Return the SQL statements in the file at <path>, without comments."""
+    with open(path, "r") as sql_file:
+        text = re.sub(r"--[^\n]*", "", sql_file.read())
+    return [statement.strip() for statement in text.split(";")
+            if statement.strip()]
+
+
+# 보고서 파일의 INSERT INTO qN ... 문장에서 테이블 이름과 쿼리를 꺼낸다.
+# 열 목록이 있으면 건너뛰지만, 괄호로 감싼 쿼리는 쿼리로 본다.
+_REPORT_INSERT = re.compile(
+    r"INSERT\s+INTO\s+(q\d+)\s*"
+    r"(?:\((?!\s*(?:SELECT|WITH|VALUES)\b)[^)]*\)\s*)?(.+)",
+    re.IGNORECASE | re.DOTALL
+)
+
 
 def setup(
         dbname: str, username: str, password: str, schema_path: str,
@@ -390,26 +2466,22 @@ def setup(
     <schema_path> and <data_path> are the relative/absolute paths to the files
     containing the schema and the data respectively.
     """
+    global _setup_generation
     connection, cursor, schema_file, data_file = None, None, None, None
     try:
-        connection = pg.connect(
-            dbname=dbname, user=username, password=password,
-            options="-c search_path=AirTravel"
-        )
-        connection.set_client_encoding("UTF8")
+        connection = _open_connection(dbname, username, password)
         cursor = connection.cursor()
 
         with open(schema_path, "r") as schema_file:
             cursor.execute(schema_file.read())
 
-        with open(data_path, "r") as info_file:
-            for line in info_file:
-                line_elems = line.split()
-                table_name = line_elems[1].lower()
-                file_path = line_elems[3].strip("'")
-                with open(file_path, "r", encoding='utf-8') as data_file:
-                    cursor.copy_from(data_file, table_name, sep=",")
+        for table_name, file_path in _data_files(data_path):
+            with open(file_path, "r", encoding='utf-8') as data_file:
+                cursor.copy_expert(_COPY_CSV_SQL.format(table_name),
+                                   data_file)
+        _reset_bid_sequence(cursor)
         connection.commit()
+        _setup_generation += 1
     except Exception as ex:
         connection.rollback()
         raise Exception(f"Couldn't set up environment for tests: \n{ex}")
@@ -420,6 +2492,177 @@ def setup(
             connection.close()
 
 
+# psycopg2 의 copy_from 은 따옴표를 처리하지 않으므로, 쉼표가 들어간 값도
+# 읽을 수 있도록 CSV 형식으로 COPY 한다.
+_COPY_CSV_SQL = "COPY {} FROM STDIN WITH (FORMAT CSV)"
+
+# bulk_setup 이 적재 동안 떼어 두는 제약: 적재할 테이블의 키와 그 키를
+# 가리키는 외래 키. PlaneCapacity 는 적재하지 않고 Seat 의 트리거가 채우므로,
+# 그 기본 키(ON CONFLICT 가 쓴다)는 둔다.
+_DEFERRED_CONSTRAINTS_SQL = """
+    SELECT c.conrelid::regclass::text, c.conname, c.contype,
+           pg_get_constraintdef(c.oid), c.confrelid::regclass::text
+    FROM pg_constraint c
+    WHERE (c.contype IN ('p', 'u', 'f')
+           AND c.conrelid = ANY(%(tables)s::regclass[]))
+       OR (c.contype = 'f' AND c.confrelid = ANY(%(tables)s::regclass[]))
+    ORDER BY c.conrelid::regclass::text, c.conname
+"""
+_DEFERRED_INDEXES_SQL = """
+    SELECT i.indrelid::regclass::text, i.indexrelid::regclass::text,
+           pg_get_indexdef(i.indexrelid)
+    FROM pg_index i
+    WHERE i.indrelid = ANY(%(tables)s::regclass[])
+      AND NOT EXISTS (SELECT 1 FROM pg_constraint c
+                      WHERE c.conindid = i.indexrelid)
+"""
+
+
+def _data_files(data_path: str) -> list[tuple[str, str]]:
+    """Return the (table, CSV file) of each \\copy line in the populate file
+    at <data_path>, in order.
+    """
+    files = []
+    with open(data_path, "r") as info_file:
+        for line in info_file:
+            line_elems = line.split()
+            if line_elems:
+                files.append((line_elems[1].lower(), line_elems[3].strip("'")))
+    return files
+
+
+def _load_levels(tables: list[str], references: dict[str, set[str]]
+                 ) -> list[list[str]]:
+    """Return <tables> grouped into levels, such that every table a table
+    in some level references (according to <references>) is in an earlier
+    level. Tables in the same level can be loaded at the same time.
+    """
+    levels, placed = [], set()
+    remaining = list(tables)
+    while remaining:
+        level = [table for table in remaining
+                 if references.get(table, set()) - {table} <= placed]
+        if not level:
+            raise ValueError(f"circular references among {remaining}")
+        levels.append(level)
+        placed.update(level)
+        remaining = [table for table in remaining if table not in placed]
+    return levels
+
+
+def bulk_setup(
+        dbname: str, username: str, password: str, schema_path: str,
+        data_path: str, workers: int = 4
+) -> dict[str, dict]:
+    """Set up the testing environment exactly like setup(), but faster for
+    large data files, and return the number of rows, seconds and rows per
+    second of the load of each table.
+
+    The primary key, unique and foreign key constraints (and any other
+    indexes) of the loaded tables are dropped once the schema is created,
+    and added back after all the data is in. Tables are loaded in the order
+    of their foreign keys, with the tables that don't depend on each other
+    loaded at the same time over up to <workers> connections.
+
+    Unlike setup(), the tables are not loaded in a single transaction: if
+    the load fails, the database is left half-loaded, and setting it up
+    again is the only way out.
+    """
+    global _setup_generation
+    connection, cursor = None, None
+    files = _data_files(data_path)
+    tables = [table for table, _ in files]
+    stats = {}
+
+    def copy(table: str, file_path: str) -> None:
+        copy_connection = _open_connection(dbname, username, password)
+        try:
+            begin = time.perf_counter()
+            with open(file_path, "r", encoding='utf-8') as data_file, \
+                    copy_connection.cursor() as copy_cursor:
+                copy_cursor.copy_expert(_COPY_CSV_SQL.format(table),
+                                        data_file)
+                rows = copy_cursor.rowcount
+            copy_connection.commit()
+            seconds = time.perf_counter() - begin
+            stats[table] = {"rows": rows, "seconds": seconds,
+                            "rows_per_sec": rows / seconds if seconds else 0.0}
+        finally:
+            copy_connection.close()
+
+    def execute(statement: str) -> None:
+        ddl_connection = _open_connection(dbname, username, password)
+        try:
+            with ddl_connection.cursor() as ddl_cursor:
+                ddl_cursor.execute(statement)
+            ddl_connection.commit()
+        finally:
+            ddl_connection.close()
+
+    try:
+        connection = _open_connection(dbname, username, password)
+        cursor = connection.cursor()
+        with open(schema_path, "r") as schema_file:
+            cursor.execute(schema_file.read())
+
+        cursor.execute(_DEFERRED_CONSTRAINTS_SQL, {"tables": tables})
+        constraints = cursor.fetchall()
+        cursor.execute(_DEFERRED_INDEXES_SQL, {"tables": tables})
+        indexes = cursor.fetchall()
+        # 외래 키가 가리키는 기본 키보다 먼저 외래 키를 지워야 한다.
+        for table, name, kind, _, _ in sorted(constraints,
+                                              key=lambda c: c[2] != "f"):
+            cursor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+        for _, name, _ in indexes:
+            cursor.execute(f"DROP INDEX {name}")
+        connection.commit()
+
+        references = {}
+        for table, _, kind, _, referenced in constraints:
+            if kind == "f":
+                references.setdefault(table, set()).add(referenced)
+        paths = dict(files)
+        with ThreadPoolExecutor(max(1, workers)) as executor:
+            for level in _load_levels(tables, references):
+                list(executor.map(lambda t: copy(t, paths[t]), level))
+
+            # 기본 키와 UNIQUE 는 테이블마다 따로 만들 수 있지만, 외래 키는
+            # 양쪽 테이블을 잠그므로 인덱스가 다 만들어진 뒤 하나씩 추가한다.
+            list(executor.map(execute, [
+                f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"
+                for table, name, kind, definition, _ in constraints
+                if kind != "f"] + [definition for _, _, definition in indexes]))
+        for table, name, kind, definition, _ in constraints:
+            if kind == "f":
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        _reset_bid_sequence(cursor)
+        connection.commit()
+        cursor.execute("ANALYZE")
+        connection.commit()
+        _setup_generation += 1
+        return stats
+    except Exception as ex:
+        if connection and not connection.closed:
+            connection.rollback()
+        raise Exception(f"Couldn't set up environment for tests: \n{ex}")
+    finally:
+        if cursor and not cursor.closed:
+            cursor.close()
+        if connection and not connection.closed:
+            connection.close()
+
+
+def _reset_bid_sequence(cursor: pg_ext.cursor) -> None:
+    """Move booking_bid_seq past the largest bid in Booking using <cursor>,
+    so that ids handed out by BidAllocator don't clash with loaded data.
+    """
+    cursor.execute(
+        "SELECT setval('booking_bid_seq', COALESCE(MAX(bid), 0) + 1, false) "
+        "FROM Booking"
+    )
+
+
 def test_basics() -> None:
     """Test basic aspects of the A2 methods.
     """
@@ -524,6 +2767,715 @@ def test_basics() -> None:
         a2.disconnect()
 
 
+def test_make_bookings(dbname: str, user: str, password: str) -> None:
+    """Test make_bookings on the provided data, including requests in the
+    same batch that ask for the same seat.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    a2 = AirTravel()
+    try:
+        assert a2.connect(dbname, user, password)
+        expected = [True, False, False, False, True]
+        booked = a2.make_bookings([
+            # Valid booking
+            (17, (6, 'A'), 8, datetime(2025, 1, 15, 10, 0)),
+            # Same seat as the first request
+            (7, (6, 'A'), 8, datetime(2025, 1, 15, 11, 0)),
+            # Invalid pid
+            (39, (6, 'B'), 8, datetime(2025, 1, 15, 10, 0)),
+            # Seat doesn't exist
+            (17, (99, 'Z'), 8, datetime(2025, 1, 15, 10, 0)),
+            # Valid booking
+            (7, (6, 'B'), 8, datetime(2025, 1, 15, 10, 0)),
+        ])
+        assert booked == expected, \
+            f"[make_bookings] Expected {expected} - Got {booked}"
+
+        # Seat was booked by the previous batch
+        expected = [False]
+        booked = a2.make_bookings(
+            [(7, (6, 'A'), 8, datetime(2025, 1, 16, 10, 0))])
+        assert booked == expected, \
+            f"[make_bookings] Expected {expected} - Got {booked}"
+
+        # Malformed requests, which the database can't even compare, are
+        # rejected without failing the valid requests around them.
+        ts = datetime(2025, 1, 15, 10, 0)
+        expected = [True, False, False, False, False, False, False, True]
+        booked = a2.make_bookings([
+            (17, (7, 'A'), 8, ts),
+            # pid out of the range of INT
+            (10 ** 12, (7, 'B'), 8, ts),
+            # pid of the wrong type
+            ('x', (7, 'B'), 8, ts),
+            # seat letter longer than one character
+            (17, (7, 'BB'), 8, ts),
+            # timestamp of the wrong type
+            (17, (7, 'B'), 8, 'soon'),
+            # not a request at all
+            None,
+            (17, (7, 'B'), True, ts),
+            (7, (7, 'C'), 8, ts),
+        ])
+        assert booked == expected, \
+            f"[make_bookings malformed] Expected {expected} - Got {booked}"
+    finally:
+        a2.disconnect()
+
+
+def test_plane_capacity(dbname: str, user: str, password: str) -> None:
+    """Test that PlaneCapacity follows inserts, updates and deletes on Seat,
+    and that plane_capacity sees the changes.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    a2 = AirTravel()
+    try:
+        assert a2.connect(dbname, user, password)
+        cursor = a2.connection.cursor()
+        cursor.execute("SELECT class, COUNT(*) FROM Seat "
+                       "WHERE plane = 'D84KL' GROUP BY class")
+        expected = dict(cursor.fetchall())
+        a2.connection.rollback()
+        capacity = a2.plane_capacity("D84KL")
+        assert capacity == expected, \
+            f"[plane_capacity] Expected {expected} - Got {capacity}"
+
+        # Move every first class seat to business, and add one economy seat.
+        cursor.execute("UPDATE Seat SET class = 'business' "
+                       "WHERE plane = 'D84KL' AND class = 'first'")
+        cursor.execute("INSERT INTO Seat VALUES "
+                       "((SELECT MAX(sid) + 1 FROM Seat), 'D84KL', 99, 'A', "
+                       "'economy')")
+        a2.connection.commit()
+        expected["business"] = expected.get("business", 0) + \
+            expected.pop("first", 0)
+        expected["economy"] = expected.get("economy", 0) + 1
+        capacity = a2.plane_capacity("D84KL")
+        assert capacity == expected, \
+            f"[plane_capacity] Expected {expected} - Got {capacity}"
+
+        # PlaneCapacity matches Seat for every plane.
+        cursor.execute("DELETE FROM Seat WHERE plane = 'D84KL' AND row = 99")
+        a2.connection.commit()
+        cursor.execute(
+            "(SELECT plane, class, COUNT(*) FROM Seat GROUP BY plane, class "
+            " EXCEPT SELECT * FROM PlaneCapacity) UNION ALL "
+            "(SELECT * FROM PlaneCapacity EXCEPT "
+            " SELECT plane, class, COUNT(*) FROM Seat GROUP BY plane, class)"
+        )
+        expected = []
+        difference = cursor.fetchall()
+        a2.connection.rollback()
+        assert difference == expected, \
+            f"[PlaneCapacity] Expected {expected} - Got {difference}"
+    finally:
+        a2.disconnect()
+
+
+def _table_digests(dbname: str, user: str, password: str) -> dict[str, str]:
+    """Return a digest of the contents of each table in AirTravel, and of
+    its constraints.
+    """
+    connection = _open_connection(dbname, user, password)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT tablename FROM pg_tables "
+                       "WHERE schemaname = 'airtravel' ORDER BY tablename")
+        digests = {}
+        for (table,) in cursor.fetchall():
+            cursor.execute(f"SELECT md5(string_agg(t::text, ',' "
+                           f"ORDER BY t::text)) FROM {table} t")
+            digests[table] = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT string_agg(conname || ' ' || pg_get_constraintdef(oid), "
+            "', ' ORDER BY conname) FROM pg_constraint "
+            "WHERE connamespace = 'airtravel'::regnamespace")
+        digests["constraints"] = cursor.fetchone()[0]
+        return digests
+    finally:
+        connection.close()
+
+
+def test_reassign_planes(dbname: str, user: str, password: str) -> None:
+    """Test that reassign_planes moves every flight it can off all the
+    grounded planes, and never onto one of them.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    grounded = ["D84KL", "J00YZ", "Q21PS", "S95PF"]
+    a2 = AirTravel()
+    try:
+        assert a2.connect(dbname, user, password)
+        unscheduled = sorted(a2.reassign_planes(
+            grounded + ["D84KL"], date(2022, 1, 1), date(2025, 12, 31)))
+        cursor = a2.connection.cursor()
+        cursor.execute("SELECT fid FROM Flight WHERE plane = ANY(%s) "
+                       "ORDER BY fid", (grounded,))
+        remaining = [row[0] for row in cursor.fetchall()]
+        a2.connection.rollback()
+        assert unscheduled == [], \
+            f"[reassign_planes] Expected [] - Got {unscheduled}"
+        assert remaining == [], \
+            f"[grounded flights] Expected [] - Got {remaining}"
+
+        nothing = a2.reassign_planes([], date(2022, 1, 1), date(2025, 1, 1))
+        assert nothing == [], f"[reassign_planes] Expected [] - Got {nothing}"
+    finally:
+        a2.disconnect()
+
+
+def test_prepared_statements(dbname: str, user: str, password: str) -> None:
+    """Test that the hot statements are prepared once per connection, and
+    prepared again after setup(), after they are deallocated behind the
+    instance's back, and after reconnecting.
+    """
+    def prepared(a2: AirTravel) -> list[str]:
+        cursor = a2.connection.cursor()
+        cursor.execute("SELECT name FROM pg_prepared_statements "
+                       "ORDER BY name")
+        names = [row[0] for row in cursor.fetchall()]
+        a2.connection.rollback()
+        return names
+
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    a2 = AirTravel()
+    try:
+        assert a2.connect(dbname, user, password)
+        assert a2.make_booking(17, (6, "A"), 8, datetime(2025, 1, 15, 10))
+        assert not a2.make_booking(17, (6, "A"), 8, datetime(2025, 1, 15, 10))
+        names = prepared(a2)
+        assert names == ["airtravel_book"], \
+            f"[prepared] Expected ['airtravel_book'] - Got {names}"
+
+        setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+              "./populate_data.sql")
+        assert a2.make_booking(17, (6, "A"), 8, datetime(2025, 1, 15, 10))
+        capacity = a2.plane_capacity("D84KL")
+        assert capacity is not None, \
+            f"[plane_capacity] Expected capacities - Got {capacity}"
+
+        cursor = a2.connection.cursor()
+        cursor.execute("DEALLOCATE ALL")
+        a2.connection.commit()
+        assert a2.make_booking(17, (6, "B"), 8, datetime(2025, 1, 15, 10))
+        names = prepared(a2)
+        assert names == ["airtravel_book"], \
+            f"[prepared] Expected ['airtravel_book'] - Got {names}"
+
+        assert a2.disconnect() and a2.connect(dbname, user, password)
+        assert a2.make_booking(17, (6, "C"), 8, datetime(2025, 1, 15, 10))
+        a2.statements = None
+        assert a2.make_booking(17, (6, "D"), 8, datetime(2025, 1, 15, 10))
+        names = prepared(a2)
+        assert names == ["airtravel_book"], \
+            f"[prepared] Expected ['airtravel_book'] - Got {names}"
+    finally:
+        a2.disconnect()
+
+
+def test_bulk_setup(dbname: str, user: str, password: str) -> None:
+    """Test that bulk_setup loads the same data, with the same constraints,
+    as setup.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    expected = _table_digests(dbname, user, password)
+    stats = bulk_setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+                       "./populate_data.sql")
+    digests = _table_digests(dbname, user, password)
+    assert digests == expected, \
+        f"[bulk_setup] Expected {expected} - Got {digests}"
+    rows = stats["booking"]["rows"]
+    assert rows == 43, f"[bulk_setup] Expected 43 - Got {rows}"
+
+
+def test_instrumentation(dbname: str, user: str, password: str) -> None:
+    """Test that an Instrumentation records the calls, round trips and
+    make_booking outcomes of the instance it is attached to.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    a2 = AirTravel()
+    try:
+        assert a2.connect(dbname, user, password)
+        a2.instrumentation = Instrumentation(trace_size=10)
+        a2.make_booking(17, (6, "A"), 8, datetime(2025, 1, 15, 10))
+        a2.make_booking(7, (6, "A"), 8, datetime(2025, 1, 15, 10))
+        a2.make_booking(7, (6, "B"), 8, datetime(2030, 1, 1))
+        a2.make_booking(39, (6, "A"), 8, datetime(2025, 1, 15, 10))
+        a2.find_unreachable_from("YYZ")
+        snapshot = a2.instrumentation.snapshot()
+
+        expected = {"booked": 1, "seat_taken": 1, "too_late": 1,
+                    "no_passenger": 1}
+        outcomes = snapshot["calls"]["make_booking"]["outcomes"]
+        assert outcomes == expected, \
+            f"[make_booking outcomes] Expected {expected} - Got {outcomes}"
+        count = snapshot["statements"]["book"]["latency"]["count"]
+        assert count == 4, f"[book statements] Expected 4 - Got {count}"
+        methods = [call["method"] for call in a2.instrumentation.trace]
+        expected = ["make_booking"] * 4 + ["find_unreachable_from"]
+        assert methods == expected, \
+            f"[trace] Expected {expected} - Got {methods}"
+        trips = sum(call["round_trips"] for call in a2.instrumentation.trace)
+        total = sum(call["round_trips"]
+                    for call in snapshot["calls"].values())
+        assert trips == total, f"[round trips] Expected {total} - Got {trips}"
+
+        a2.instrumentation = None
+        a2.make_booking(17, (6, "B"), 8, datetime(2025, 1, 15, 10))
+        assert type(a2.connection.cursor()) is pg_ext.cursor, \
+            "[cursor] Expected a plain cursor once instrumentation is off"
+    finally:
+        a2.disconnect()
+
+
+def test_reference_cache(dbname: str, user: str, password: str) -> None:
+    """Test that make_booking gives the same answers with reference caching
+    on, and that cached prices are dropped when FlightPrice changes.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    a2 = AirTravel()
+    try:
+        assert a2.connect(dbname, user, password)
+        a2.cache_references(maxsize=100, ttl=None)
+        cases = [
+            ((39, (6, "A"), 8, datetime(2025, 1, 15, 10)), False),
+            ((17, (6, "A"), 8, datetime(2025, 1, 15, 10)), True),
+            ((7, (6, "A"), 8, datetime(2025, 1, 15, 10)), False),
+            ((7, (6, "B"), 8, datetime(2030, 1, 1)), False),
+            ((7, (99, "Z"), 8, datetime(2025, 1, 15, 10)), False),
+            ((7, (6, "B"), 8, datetime(2025, 1, 15, 10)), True),
+        ]
+        for request, expected in cases:
+            booked = a2.make_booking(*request)
+            assert booked == expected, \
+                f"[make_booking{request}] Expected {expected} - Got {booked}"
+        hits = a2.cache_stats()["flight"]["hits"]
+        assert hits > 0, f"[flight cache hits] Expected > 0 - Got {hits}"
+
+        # A price update like u1.sql is seen by the next booking.
+        cursor = a2.connection.cursor()
+        cursor.execute("UPDATE FlightPrice SET price = price + 1000 "
+                       "WHERE fid = 8")
+        cursor.execute("SELECT fp.price FROM FlightPrice fp JOIN Seat s "
+                       "ON s.class = fp.class JOIN Flight f "
+                       "ON f.plane = s.plane AND f.fid = fp.fid "
+                       "WHERE fp.fid = 8 AND s.row = 6 AND s.letter = 'C'")
+        expected = cursor.fetchone()[0]
+        a2.connection.commit()
+        assert a2.make_booking(7, (6, "C"), 8, datetime(2025, 1, 15, 10))
+        cursor.execute("SELECT price FROM Booking WHERE bid = "
+                       "(SELECT MAX(bid) FROM Booking)")
+        price = cursor.fetchone()[0]
+        a2.connection.rollback()
+        assert price == expected, \
+            f"[booking price] Expected {expected} - Got {price}"
+    finally:
+        a2.disconnect()
+
+
+def test_seat_map(dbname: str, user: str, password: str) -> None:
+    """Test seat_map, and that make_booking rejects seats its cached seat
+    map knows are taken until a change to Booking is notified.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    a2 = AirTravel()
+    other = _open_connection(dbname, user, password)
+    try:
+        assert a2.connect(dbname, user, password)
+        ts = datetime(2025, 1, 15, 10)
+        seats = a2.seat_map(8)
+        assert seats is not None and (6, "A", "economy", False) in seats, \
+            f"[seat_map(8)] Expected (6, 'A', 'economy', False) - " \
+            f"Got {seats}"
+        for fid in [-1, 999]:
+            seats = a2.seat_map(fid)
+            assert seats is None, \
+                f"[seat_map({fid})] Expected None - Got {seats}"
+
+        assert a2.make_booking(17, (6, "A"), 8, ts)
+        hits = a2.seat_maps.hits
+        booked = a2.make_booking(7, (6, "A"), 8, ts)
+        assert not booked, \
+            f"[make_booking taken seat] Expected False - Got {booked}"
+        assert a2.seat_maps.hits > hits, \
+            f"[seat map hits] Expected > {hits} - Got {a2.seat_maps.hits}"
+        outcome = a2.book(-5, (6, "A"), 8, ts)
+        expected = "no_passenger"
+        assert outcome == expected, \
+            f"[book(-5, (6, 'A'))] Expected {expected} - Got {outcome}"
+
+        # The booking is cancelled by another client; the notification
+        # drops the seat map, so the seat can be booked again.
+        cursor = other.cursor()
+        cursor.execute("DELETE FROM Booking WHERE flight = 8 AND seat = "
+                       "(SELECT s.sid FROM Seat s JOIN Flight f "
+                       "ON f.plane = s.plane WHERE f.fid = 8 "
+                       "AND s.row = 6 AND s.letter = 'A')")
+        other.commit()
+        booked = a2.make_booking(7, (6, "A"), 8, ts)
+        assert booked, \
+            f"[make_booking cancelled seat] Expected True - Got {booked}"
+    finally:
+        other.close()
+        a2.disconnect()
+
+
+def test_route_graph(dbname: str, user: str, password: str) -> None:
+    """Test that unreachable_matrix agrees with find_unreachable_from and
+    with the recursive query for every airport, and that both see a route
+    added by another client.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    a2 = AirTravel()
+    other = _open_connection(dbname, user, password)
+
+    def unreachable_in_database(code: str) -> list[str]:
+        cursor = other.cursor()
+        cursor.execute(_UNREACHABLE_SQL, {"airport": code})
+        codes = sorted(row[0] for row in cursor.fetchall())
+        other.rollback()
+        return codes
+
+    try:
+        assert a2.connect(dbname, user, password)
+        matrix = a2.unreachable_matrix()
+        cursor = other.cursor()
+        cursor.execute("SELECT code FROM Airport ORDER BY code")
+        airports = [row[0] for row in cursor.fetchall()]
+        other.rollback()
+        assert sorted(matrix) == airports, \
+            f"[unreachable_matrix] Expected {airports} - Got {sorted(matrix)}"
+        for code in airports:
+            expected = unreachable_in_database(code)
+            for name, unreachable in [
+                    ("unreachable_matrix", matrix[code]),
+                    ("find_unreachable_from", a2.find_unreachable_from(code))]:
+                assert sorted(unreachable) == expected, \
+                    f"[{name}({code})] Expected {expected} - " \
+                    f"Got {sorted(unreachable)}"
+
+        # A route from YYZ to ATL added by another client is notified, so
+        # the graph is rebuilt and ATL becomes reachable from YYZ.
+        before = sorted(a2.find_unreachable_from("YYZ"))
+        cursor.execute("INSERT INTO Route VALUES ('AC999', 'AC', 'YYZ', "
+                       "'ATL')")
+        other.commit()
+        expected = unreachable_in_database("YYZ")
+        assert "ATL" in before and expected != before, \
+            f"[new route] Expected a change from {before} - Got {expected}"
+        unreachable = sorted(a2.find_unreachable_from("YYZ"))
+        assert unreachable == expected, \
+            f"[find_unreachable_from(YYZ)] Expected {expected} - " \
+            f"Got {unreachable}"
+        unreachable = sorted(a2.unreachable_matrix()["YYZ"])
+        assert unreachable == expected, \
+            f"[unreachable_matrix(YYZ)] Expected {expected} - " \
+            f"Got {unreachable}"
+    finally:
+        other.close()
+        a2.disconnect()
+
+
+def test_stream_report(dbname: str, user: str, password: str) -> None:
+    """Test that stream_report yields the rows a report would insert into its
+    table, and leaves nothing behind.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    report = """-- Bookings per route
+SET SEARCH_PATH TO AirTravel;
+DROP TABLE IF EXISTS q9 CASCADE;
+CREATE TABLE q9 (flight_num VARCHAR(6) NOT NULL, bookings INT NOT NULL);
+DROP VIEW IF EXISTS route_booking CASCADE;
+CREATE VIEW route_booking AS
+SELECT f.route, b.bid FROM Flight f JOIN Booking b ON b.flight = f.fid;
+INSERT INTO q9
+SELECT route, COUNT(*) FROM route_booking GROUP BY route ORDER BY route;
+"""
+    a2 = AirTravel()
+    try:
+        assert a2.connect(dbname, user, password)
+        cursor = a2.connection.cursor()
+        cursor.execute("SELECT f.route, COUNT(*) FROM Flight f JOIN Booking b "
+                       "ON b.flight = f.fid GROUP BY f.route ORDER BY f.route")
+        expected = cursor.fetchall()
+        a2.connection.rollback()
+
+        with tempfile.TemporaryDirectory() as report_dir:
+            with open(os.path.join(report_dir, "q9.sql"), "w") as report_file:
+                report_file.write(report)
+            rows = list(a2.stream_report("q9", chunk_size=2,
+                                         report_dir=report_dir))
+            assert rows == expected, \
+                f"[stream_report] Expected {expected} - Got {rows}"
+            missing = a2.stream_report("q8", report_dir=report_dir)
+            assert missing is None, \
+                f"[stream_report] Expected None - Got {missing}"
+
+        cursor.execute("SELECT to_regclass('q9')")
+        table = cursor.fetchone()[0]
+        a2.connection.rollback()
+        assert table is None, f"[stream_report] Expected None - Got {table}"
+    finally:
+        a2.disconnect()
+
+
+def test_report_summaries(dbname: str, user: str, password: str) -> None:
+    """Test that the q1 and q4 summaries kept by refresh_reports match a full
+    recompute, after the initial load and after later changes.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    a2 = AirTravel()
+
+    def check(stage: str) -> None:
+        for name in ["q1", "q4"]:
+            expected = a2.summary_report(name, full=True)
+            got = a2.summary_report(name)
+            assert expected is not None and got == expected, \
+                f"[{name} {stage}] Expected {expected} - Got {got}"
+
+    try:
+        assert a2.connect(dbname, user, password)
+        refreshed = a2.refresh_reports()
+        assert refreshed > 0, \
+            f"[refresh_reports] Expected > 0 - Got {refreshed}"
+        check("after load")
+        refreshed = a2.refresh_reports()
+        assert refreshed == 0, \
+            f"[refresh_reports] Expected 0 - Got {refreshed}"
+
+        # 예약, 출발과 도착 기록, 예약 취소, 기체 변경.
+        assert a2.make_booking(17, (6, "A"), 8, datetime(2025, 1, 15, 10))
+        cursor = a2.connection.cursor()
+        cursor.execute("SELECT fid FROM Flight WHERE fid NOT IN "
+                       "(SELECT fid FROM Departure) ORDER BY fid LIMIT 2")
+        departed = [row[0] for row in cursor.fetchall()]
+        cursor.execute("INSERT INTO Departure SELECT fid, sched_dept "
+                       "FROM Flight WHERE fid = ANY(%s)", (departed,))
+        cursor.execute("INSERT INTO Arrival SELECT fid, sched_arrival "
+                       "+ INTERVAL '25 minutes' FROM Flight WHERE fid = %s",
+                       (departed[0],))
+        cursor.execute("DELETE FROM Booking WHERE bid = (SELECT MIN(bid) "
+                       "FROM Booking)")
+        a2.connection.commit()
+        a2.reassign_plane("D84KL", date(2024, 1, 1), date(2025, 12, 31))
+        refreshed = a2.refresh_reports()
+        assert 0 < refreshed < 23, \
+            f"[refresh_reports] Expected between 1 and 22 - Got {refreshed}"
+        check("after changes")
+
+        refreshed = a2.refresh_reports(full=True)
+        assert refreshed == 23, \
+            f"[refresh_reports] Expected 23 - Got {refreshed}"
+        check("after rebuild")
+        missing = a2.summary_report("q2")
+        assert missing is None, f"[summary_report] Expected None - Got {missing}"
+    finally:
+        a2.disconnect()
+
+
+def test_snapshot(dbname: str, user: str, password: str) -> None:
+    """Test that the q1 and q4 aggregates of an exported snapshot match the
+    ones computed by the database.
+    """
+    from snapshot import Snapshot
+
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    a2 = AirTravel()
+    try:
+        assert a2.connect(dbname, user, password)
+        with tempfile.TemporaryDirectory() as path:
+            rows = a2.export_snapshot(path)
+            expected = {"flight": 23, "booking": 43, "flightprice": 63}
+            assert rows == expected, \
+                f"[export_snapshot] Expected {expected} - Got {rows}"
+            snapshot = Snapshot(path)
+            for name, got in [("q1", snapshot.route_fullness()),
+                              ("q4", snapshot.airline_stats())]:
+                expected = a2.summary_report(name, full=True)
+                assert got == expected, \
+                    f"[snapshot {name}] Expected {expected} - Got {got}"
+    finally:
+        a2.disconnect()
+
+
+def _booking_worker(credentials: tuple[str, str, str], requests: list) -> int:
+    """Make each of the bookings in <requests> with a new AirTravel instance
+    connected using <credentials>, and return how many of them failed.
+    """
+    a2 = AirTravel()
+    assert a2.connect(*credentials)
+    try:
+        return sum(not a2.make_booking(*request) for request in requests)
+    finally:
+        a2.disconnect()
+
+
+def _free_seat_requests(dbname: str, user: str, password: str,
+                        count: int) -> list:
+    """Return up to <count> booking requests, in the form accepted by
+    make_booking, for distinct seats that are not booked yet.
+    """
+    connection = _open_connection(dbname, user, password)
+    try:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT (SELECT MIN(pid) FROM Passenger), f.fid, s.row, s.letter, "
+            "       f.sched_dept "
+            "FROM Flight f JOIN Seat s ON s.plane = f.plane "
+            "JOIN FlightPrice fp ON fp.fid = f.fid AND fp.class = s.class "
+            "WHERE NOT EXISTS (SELECT 1 FROM Booking b "
+            "                  WHERE b.flight = f.fid AND b.seat = s.sid) "
+            "ORDER BY f.fid, s.row, s.letter LIMIT %s", (count,)
+        )
+        requests = [(pid, (row, letter), fid, dept - timedelta(days=1))
+                    for pid, fid, row, letter, dept in cursor.fetchall()]
+        cursor.close()
+        return requests
+    finally:
+        connection.close()
+
+
+def _contending_worker(credentials: tuple[str, str, str], requests: list,
+                       seed: int) -> Counter:
+    """Try to book each of <requests>, in an order fixed by <seed>, with a
+    new AirTravel instance connected using <credentials>, and return how
+    many times each outcome of book() was returned.
+    """
+    requests = list(requests)
+    random.Random(seed).shuffle(requests)
+    a2 = AirTravel()
+    assert a2.connect(*credentials)
+    try:
+        return Counter(a2.book(*request) for request in requests)
+    finally:
+        a2.disconnect()
+
+
+def _count_bookings(dbname: str, user: str, password: str) -> int:
+    """Return the number of rows in Booking."""
+    connection = _open_connection(dbname, user, password)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COUNT(*) FROM Booking")
+        return cursor.fetchone()[0]
+    finally:
+        connection.close()
+
+
+def test_concurrent_bookings(dbname: str, user: str, password: str,
+                             processes: int = 8, bookings: int = 2000) -> None:
+    """Make <bookings> bookings for distinct free seats from <processes>
+    processes at once, and check that every one of them succeeded, i.e.,
+    that no two processes were handed the same bid.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    requests = _free_seat_requests(dbname, user, password, bookings)
+    before = _count_bookings(dbname, user, password)
+
+    credentials = (dbname, user, password)
+    chunks = [requests[i::processes] for i in range(processes)]
+    with multiprocessing.Pool(processes) as pool:
+        failures = sum(pool.starmap(
+            _booking_worker, [(credentials, chunk) for chunk in chunks]))
+    expected = 0
+    assert failures == expected, \
+        f"[concurrent bookings] Expected {expected} failures - Got {failures}"
+
+    added = _count_bookings(dbname, user, password) - before
+    expected = len(requests)
+    assert added == expected, \
+        f"[concurrent bookings] Expected {expected} new bookings - " \
+        f"Got {added}"
+
+
+def test_contended_bookings(dbname: str, user: str, password: str,
+                            processes: int = 8) -> None:
+    """Have <processes> processes race to book every free seat of the same
+    flight, and check that each seat was booked exactly once, and that every
+    other attempt was told the seat was taken rather than failing.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    requests = _free_seat_requests(dbname, user, password, 10 ** 6)
+    popular = Counter(request[2] for request in requests).most_common(1)
+    requests = [request for request in requests
+                if request[2] == popular[0][0]]
+    before = _count_bookings(dbname, user, password)
+
+    credentials = (dbname, user, password)
+    with multiprocessing.Pool(processes) as pool:
+        outcomes = sum(pool.starmap(
+            _contending_worker,
+            [(credentials, requests, seed) for seed in range(processes)]),
+            Counter())
+    expected = {"booked": len(requests),
+                "seat_taken": len(requests) * (processes - 1)}
+    assert outcomes == expected, \
+        f"[contended bookings] Expected {expected} - Got {dict(outcomes)}"
+
+    added = _count_bookings(dbname, user, password) - before
+    expected = len(requests)
+    assert added == expected, \
+        f"[contended bookings] Expected {expected} new bookings - " \
+        f"Got {added}"
+
+
+def test_pooled_bookings(dbname: str, user: str, password: str,
+                         threads: int = 16, maxconn: int = 4,
+                         bookings: int = 1000) -> None:
+    """Call make_booking, find_unreachable_from and reassign_plane from
+    <threads> threads sharing one AirTravel backed by a pool of <maxconn>
+    connections, and check that every booking succeeded and every call got
+    a connection.
+    """
+    setup(dbname, user, password, "./a2_airtravel_schema.ddl",
+          "./populate_data.sql")
+    requests = _free_seat_requests(dbname, user, password, bookings)
+    a2 = AirTravel()
+    try:
+        connected = a2.connect_pool(dbname, user, password, maxconn=maxconn)
+        assert connected, f"[connect_pool] Expected True | Got {connected}."
+
+        failures = []
+
+        def work(chunk: list) -> None:
+            for request in chunk:
+                if not a2.make_booking(*request):
+                    failures.append(request)
+                if a2.find_unreachable_from("YYZ") is None:
+                    failures.append("YYZ")
+            a2.reassign_plane("D84KL", date(2024, 1, 1), date(2024, 1, 1))
+
+        workers = [threading.Thread(target=work, args=(requests[i::threads],))
+                   for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        expected = []
+        assert failures == expected, \
+            f"[pooled bookings] Expected {expected} - Got {failures[:5]}"
+        stats = a2.pool.stats()
+        assert stats["open"] <= maxconn, \
+            f"[pooled bookings] Expected at most {maxconn} connections - " \
+            f"Got {stats['open']}"
+    finally:
+        a2.disconnect()
+
+
 if __name__ == "__main__":
     # Un comment-out the next two lines if you would like to run the doctest
     # examples (see ">>>" in the methods connect and disconnect)
@@ -0,0 +1,690 @@
+"""CSC343 Assignment 2
+
+=== Module Description ===
+
+This file contains benchmarks for the AirTravel class. Each benchmark loads a
+fresh copy of the schema and data using setup(), runs a workload against it
+and prints latency percentiles.
+
+The suite benchmark instead loads datasets of several scales made by
+generate_data.py with bulk_setup(), times every AirTravel method and the
+q1 - q5 reports on each, and writes the latencies, row counts and plan
+hashes (of the reports and of the statements AirTravel sends) to a JSON
+file.
+Given the results of an earlier run with --baseline, it also prints what got
+slower and which plans changed.
+
+The prepared benchmark compares, on a generated dataset, the server time
+(planning and execution, from EXPLAIN ANALYZE) of each statement AirTravel
+prepares when it is sent as plain SQL and when it is run with EXECUTE, and
+the latency of make_booking with and without prepared statements.
+
+The grounding benchmark generates a single airline with a large fleet,
+grounds a share of its planes for a month, and compares reassigning them
+plane by plane with reassign_plane against one reassign_planes call.
+
+Example:
+    python benchmark.py booking csc343h-user user "" --bookings 500
+    python benchmark.py suite csc343h-user user "" --scales 0.01 0.1 1
+    python benchmark.py grounding csc343h-user user "" --fleet 300
+    python benchmark.py prepared csc343h-user user "" --scales 0.1
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Callable
+
+import psycopg2 as pg
+import psycopg2.extensions as pg_ext
+
+from a2_embedded import (
+    AirTravel, PreparedStatements, _PREPARED_SQL, _numbered, bulk_setup, setup
+)
+from generate_data import (
+    FIRST_DEPARTURE, LAST_DEPARTURE, generate, scaled_sizes
+)
+from index_advisor import (
+    REPORT_FILES, airtravel_workload, explain, plan_nodes, split_statements
+)
+
+SCHEMA_FILE = "./a2_airtravel_schema.ddl"
+DATA_FILE = "./populate_data.sql"
+
+# The month the grounding benchmark grounds planes for.
+GROUNDING_START = date(2025, 6, 1)
+GROUNDING_END = date(2025, 6, 30)
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """Return the <q>-th percentile (0 <= q <= 100) of <samples> using the
+    nearest-rank method, or 0.0 if <samples> is empty.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1,
+                      int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(name: str, samples: list[float]) -> dict:
+    """Print and return the latency summary (in milliseconds) of <samples>,
+    which are durations in seconds.
+    """
+    summary = {
+        "name": name,
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples, default=0.0) * 1000,
+    }
+    print(f"{name:<28} n={summary['count']:<6} "
+          f"p50={summary['p50_ms']:8.3f}ms p99={summary['p99_ms']:8.3f}ms "
+          f"max={summary['max_ms']:8.3f}ms")
+    return summary
+
+
+def sequential_make_booking(connection: pg_ext.connection, pid, seat, fid,
+                            timestamp) -> bool:
+    """Book <seat> on <fid> for <pid> with one statement per check, the way
+    AirTravel.make_booking used to. This is only kept as a baseline for the
+    benchmarks.
+    """
+    row_val, letter = seat
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1 FROM Passenger WHERE pid = %s", (pid,))
+        if cursor.fetchone() is None:
+            return False
+        cursor.execute(
+            "SELECT sched_dept, plane FROM Flight WHERE fid = %s", (fid,))
+        flight_row = cursor.fetchone()
+        if flight_row is None:
+            return False
+        sched_dept, plane = flight_row
+        if timestamp > sched_dept - timedelta(hours=1):
+            return False
+        cursor.execute(
+            "SELECT sid, class FROM Seat "
+            "WHERE plane = %s AND row = %s AND letter = %s",
+            (plane, row_val, letter))
+        seat_row = cursor.fetchone()
+        if seat_row is None:
+            return False
+        sid, seat_class = seat_row
+        cursor.execute(
+            "SELECT 1 FROM Booking WHERE flight = %s AND seat = %s",
+            (fid, sid))
+        if cursor.fetchone() is not None:
+            return False
+        cursor.execute(
+            "SELECT price FROM FlightPrice WHERE fid = %s AND class = %s",
+            (fid, seat_class))
+        price_row = cursor.fetchone()
+        if price_row is None:
+            return False
+        cursor.execute("SELECT COALESCE(MAX(bid), 0) FROM Booking")
+        new_bid = cursor.fetchone()[0] + 1
+        cursor.execute(
+            "INSERT INTO Booking (bid, passenger, seat, flight, price, "
+            "date_time) VALUES (%s, %s, %s, %s, %s, %s)",
+            (new_bid, pid, sid, fid, price_row[0], timestamp))
+        connection.commit()
+        return True
+    except Exception:
+        return False
+    finally:
+        connection.rollback()
+
+
+def booking_requests(a2: AirTravel, count: int, seed: int = 343) -> list:
+    """Return up to <count> (pid, seat, fid, timestamp) booking requests for
+    free seats in the database <a2> is connected to, in a random order that
+    is fixed by <seed>.
+    """
+    cursor = a2.connection.cursor()
+    cursor.execute("SELECT pid FROM Passenger")
+    pids = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT f.fid, s.row, s.letter, f.sched_dept "
+        "FROM Flight f JOIN Seat s ON s.plane = f.plane "
+        "JOIN FlightPrice fp ON fp.fid = f.fid AND fp.class = s.class "
+        "WHERE NOT EXISTS (SELECT 1 FROM Booking b "
+        "                  WHERE b.flight = f.fid AND b.seat = s.sid)")
+    free = cursor.fetchall()
+    cursor.close()
+    a2.connection.rollback()
+    rng = random.Random(seed)
+    rng.shuffle(free)
+    return [(rng.choice(pids), (row, letter), fid, dept - timedelta(days=1))
+            for fid, row, letter, dept in free[:count]]
+
+
+def time_calls(call: Callable, requests: list) -> tuple[list[float], int]:
+    """Call <call> with each of <requests> and return the duration of each
+    call in seconds, and how many of the calls returned True.
+    """
+    samples, successes = [], 0
+    for request in requests:
+        begin = time.perf_counter()
+        successes += bool(call(*request))
+        samples.append(time.perf_counter() - begin)
+    return samples, successes
+
+
+def bench_booking(args: argparse.Namespace) -> list[dict]:
+    """Compare the latency of AirTravel.make_booking with the
+    statement-per-check baseline on the same set of booking requests.
+    """
+    results = []
+    a2 = AirTravel()
+    assert a2.connect(args.dbname, args.user, args.password)
+    try:
+        for name in ("sequential", "make_booking"):
+            setup(args.dbname, args.user, args.password, args.schema,
+                  args.data)
+            requests = booking_requests(a2, args.bookings, args.seed)
+            if name == "sequential":
+                call = lambda *r: sequential_make_booking(a2.connection, *r)
+            else:
+                call = a2.make_booking
+            samples, successes = time_calls(call, requests)
+            assert successes == len(requests), \
+                f"[{name}] Expected {len(requests)} bookings - Got {successes}"
+            results.append(summarize(name, samples))
+    finally:
+        a2.disconnect()
+    return results
+
+
+def bench_batch(args: argparse.Namespace) -> list[dict]:
+    """Compare the throughput (bookings/sec) of make_bookings, in batches of
+    args.batch_size, with calling make_booking once per request.
+    """
+    results = []
+    a2 = AirTravel()
+    assert a2.connect(args.dbname, args.user, args.password)
+    try:
+        for name in ("make_booking", "make_bookings"):
+            setup(args.dbname, args.user, args.password, args.schema,
+                  args.data)
+            requests = booking_requests(a2, args.bookings, args.seed)
+            begin = time.perf_counter()
+            if name == "make_booking":
+                successes = sum(a2.make_booking(*r) for r in requests)
+            else:
+                successes = 0
+                for i in range(0, len(requests), args.batch_size):
+                    batch = requests[i:i + args.batch_size]
+                    successes += sum(a2.make_bookings(batch))
+            elapsed = time.perf_counter() - begin
+            assert successes == len(requests), \
+                f"[{name}] Expected {len(requests)} bookings - Got {successes}"
+            rate = successes / elapsed if elapsed else 0.0
+            print(f"{name:<28} n={successes:<6} {rate:10.1f} bookings/sec")
+            results.append({"name": name, "count": successes,
+                            "bookings_per_sec": rate})
+    finally:
+        a2.disconnect()
+    return results
+
+
+def bench_async(args: argparse.Namespace) -> list[dict]:
+    """Compare the throughput of AsyncAirTravel.make_booking, with
+    args.concurrency bookings in flight on one event loop, with running
+    AirTravel.make_booking in a thread executor of the same size over a
+    pooled AirTravel.
+    """
+    from a2_async import AsyncAirTravel
+
+    async def run_async(requests: list) -> int:
+        a2 = AsyncAirTravel()
+        assert await a2.connect(args.dbname, args.user, args.password,
+                                max_size=args.connections)
+        try:
+            limit = asyncio.Semaphore(args.concurrency)
+
+            async def book(request: tuple) -> bool:
+                async with limit:
+                    return await a2.make_booking(*request)
+
+            return sum(await asyncio.gather(*map(book, requests)))
+        finally:
+            await a2.disconnect()
+
+    async def run_executor(requests: list) -> int:
+        a2 = AirTravel()
+        assert a2.connect_pool(args.dbname, args.user, args.password,
+                               maxconn=args.connections)
+        loop = asyncio.get_running_loop()
+        try:
+            with ThreadPoolExecutor(args.concurrency) as executor:
+                return sum(await asyncio.gather(*[
+                    loop.run_in_executor(executor, a2.make_booking, *r)
+                    for r in requests]))
+        finally:
+            a2.disconnect()
+
+    results = []
+    a2 = AirTravel()
+    assert a2.connect(args.dbname, args.user, args.password)
+    try:
+        for name, run in (("thread executor", run_executor),
+                          ("asyncio", run_async)):
+            setup(args.dbname, args.user, args.password, args.schema,
+                  args.data)
+            requests = booking_requests(a2, args.bookings, args.seed)
+            begin = time.perf_counter()
+            successes = asyncio.run(run(requests))
+            elapsed = time.perf_counter() - begin
+            assert successes == len(requests), \
+                f"[{name}] Expected {len(requests)} bookings - Got {successes}"
+            rate = successes / elapsed if elapsed else 0.0
+            print(f"{name:<28} n={successes:<6} {rate:10.1f} bookings/sec")
+            results.append({"name": name, "count": successes,
+                            "bookings_per_sec": rate})
+    finally:
+        a2.disconnect()
+    return results
+
+
+TABLES = ["Airline", "Airport", "Route", "Passenger", "Plane", "Seat",
+          "Flight", "Departure", "Arrival", "FlightPrice", "Booking"]
+
+
+def plan_hash(plan: dict) -> str:
+    """Return a short hash of the shape of the EXPLAIN (FORMAT JSON) plan
+    tree <plan>: its node types, join types, relations and indexes, but not
+    its costs or row estimates, which change with the data.
+    """
+    shape = [(node["Node Type"], node.get("Join Type"),
+              node.get("Relation Name"), node.get("Index Name"))
+             for node in plan_nodes(plan)]
+    return hashlib.sha1(repr(shape).encode()).hexdigest()[:12]
+
+
+def dataset(args: argparse.Namespace, scale: float) -> str:
+    """Return the path of the populate file of the dataset of <scale>,
+    generating the dataset in args.data_dir if it is not there already.
+    """
+    out_dir = os.path.join(args.data_dir, f"scale_{scale:g}")
+    populate = os.path.join(out_dir, "populate_data.sql")
+    if not os.path.exists(populate):
+        generate(out_dir, args.seed, **scaled_sizes(scale))
+    return populate
+
+
+def row_counts(a2: AirTravel) -> dict[str, int]:
+    """Return the number of rows in each table of the database <a2> is
+    connected to.
+    """
+    cursor = a2.connection.cursor()
+    counts = {}
+    for table in TABLES:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        counts[table] = cursor.fetchone()[0]
+    cursor.close()
+    a2.connection.rollback()
+    return counts
+
+
+def time_concurrent(a2: AirTravel, requests: list, threads: int
+                    ) -> tuple[list[float], int, float]:
+    """Call a2.make_booking with each of <requests> from <threads> threads,
+    and return the duration of each call in seconds, how many returned True,
+    and the total elapsed time in seconds.
+    """
+    def timed(request: tuple) -> tuple[float, bool]:
+        begin = time.perf_counter()
+        booked = a2.make_booking(*request)
+        return time.perf_counter() - begin, booked
+
+    begin = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        outcomes = list(executor.map(timed, requests))
+    elapsed = time.perf_counter() - begin
+    return ([duration for duration, _ in outcomes],
+            sum(booked for _, booked in outcomes), elapsed)
+
+
+def time_report(connection: pg_ext.connection, path: str, repeat: int
+                ) -> dict:
+    """Run the report in the file at <path> <repeat> times using
+    <connection>, and return the latency summary of its INSERT INTO
+    statement, the number of rows it inserts and the hash of its plan.
+    Every run is rolled back.
+
+    A report that fails is summarized as {"error": <message>}.
+    """
+    name = path.rsplit("/", 1)[-1]
+    cursor = connection.cursor()
+    samples, result = [], {}
+    try:
+        statements = split_statements(path)
+        for _ in range(repeat):
+            for statement in statements:
+                if not re.match(r"INSERT\s+INTO\s+q\d", statement,
+                                re.IGNORECASE):
+                    cursor.execute(statement)
+                    continue
+                cursor.execute("EXPLAIN (FORMAT JSON) " + statement)
+                result["plan_hash"] = plan_hash(cursor.fetchone()[0][0]["Plan"])
+                begin = time.perf_counter()
+                cursor.execute(statement)
+                samples.append(time.perf_counter() - begin)
+                result["rows"] = cursor.rowcount
+            connection.rollback()
+        if not samples:
+            return {"name": name, "error": "no INSERT INTO statement found"}
+        return {**summarize(name, samples), **result}
+    except pg.Error as ex:
+        return {"name": name, "error": str(ex).splitlines()[0]}
+    finally:
+        connection.rollback()
+        cursor.close()
+
+
+def statement_plans(connection: pg_ext.connection) -> dict[str, dict]:
+    """Return the hash of the plan of each statement AirTravel sends (see
+    index_advisor.airtravel_workload), by "plan <name>", using
+    <connection>. The statements are only explained, not run.
+    """
+    cursor = connection.cursor()
+    plans = {}
+    try:
+        for name, sql, params in airtravel_workload(cursor):
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            digest = plan_hash(cursor.fetchone()[0][0]["Plan"])
+            plans[f"plan {name}"] = {"plan_hash": digest}
+            print(f"{'plan ' + name:<28} {digest}")
+    finally:
+        connection.rollback()
+        cursor.close()
+    return plans
+
+
+def bench_scale(args: argparse.Namespace, scale: float) -> dict:
+    """Load the dataset of <scale> and return the results of every
+    benchmark of the suite on it.
+    """
+    populate = dataset(args, scale)
+    print(f"--- scale {scale:g}")
+    begin = time.perf_counter()
+    load = bulk_setup(args.dbname, args.user, args.password, args.schema,
+                      populate, args.workers)
+    results = {"load_seconds": time.perf_counter() - begin, "load": load}
+    print(f"{'bulk_setup':<28} {results['load_seconds']:8.3f}s")
+
+    a2 = AirTravel()
+    assert a2.connect(args.dbname, args.user, args.password)
+    try:
+        results["rows"] = row_counts(a2)
+
+        requests = booking_requests(a2, 2 * args.bookings, args.seed)
+        samples, successes = time_calls(a2.make_booking,
+                                        requests[:args.bookings])
+        results["make_booking"] = {**summarize("make_booking", samples),
+                                   "successes": successes}
+
+        pooled = AirTravel()
+        assert pooled.connect_pool(args.dbname, args.user, args.password,
+                                   maxconn=args.connections)
+        try:
+            samples, successes, elapsed = time_concurrent(
+                pooled, requests[args.bookings:], args.concurrency)
+        finally:
+            pooled.disconnect()
+        results["make_booking concurrent"] = {
+            **summarize("make_booking concurrent", samples),
+            "successes": successes,
+            "bookings_per_sec": successes / elapsed if elapsed else 0.0}
+
+        cursor = a2.connection.cursor()
+        cursor.execute("SELECT code FROM Airport ORDER BY code")
+        airports = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT tail_number FROM Plane ORDER BY tail_number")
+        planes = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        a2.connection.rollback()
+        samples, _ = time_calls(a2.find_unreachable_from,
+                                [(airport,) for airport in airports])
+        results["find_unreachable_from"] = summarize(
+            "find_unreachable_from", samples)
+
+        rng = random.Random(args.seed)
+        start, end = FIRST_DEPARTURE.date(), LAST_DEPARTURE.date()
+        chosen = rng.sample(planes, min(args.reassigns, len(planes)))
+        samples, _ = time_calls(a2.reassign_plane,
+                                [(plane, start, end) for plane in chosen])
+        results["reassign_plane"] = summarize("reassign_plane", samples)
+        results.update(statement_plans(a2.connection))
+
+        for path in args.reports:
+            report = time_report(a2.connection, path, args.repeat)
+            results[report.pop("name")] = report
+            if "error" in report:
+                print(f"{path.rsplit('/', 1)[-1]:<28} "
+                      f"failed: {report['error']}")
+    finally:
+        a2.disconnect()
+    return results
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> None:
+    """Print every latency in <results> that is more than <threshold> times
+    its value in <baseline>, and every plan whose hash changed.
+    """
+    for scale, benchmarks in results["scales"].items():
+        for name, result in benchmarks.items():
+            before = baseline.get("scales", {}).get(scale, {}).get(name)
+            if not isinstance(result, dict) or not isinstance(before, dict):
+                continue
+            for key in ("p50_ms", "p99_ms"):
+                if (key in result and before.get(key)
+                        and result[key] > threshold * before[key]):
+                    print(f"scale {scale} {name}: {key} "
+                          f"{before[key]:.3f}ms -> {result[key]:.3f}ms")
+            if before.get("plan_hash") not in (None,
+                                               result.get("plan_hash")):
+                print(f"scale {scale} {name}: plan changed "
+                      f"{before['plan_hash']} -> {result.get('plan_hash')}")
+
+
+def bench_suite(args: argparse.Namespace) -> dict:
+    """Run the suite on every scale in args.scales, write the results to
+    args.results, and compare them with args.baseline if it is given.
+    """
+    results = {
+        "started": datetime.now().isoformat(timespec="seconds"),
+        "seed": args.seed,
+        "scales": {f"{scale:g}": bench_scale(args, scale)
+                   for scale in args.scales},
+    }
+    with open(args.results, "w") as results_file:
+        json.dump(results, results_file, indent=2, default=str)
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            compare(json.load(baseline_file), results, args.threshold)
+    return results
+
+
+def fleet_dataset(args: argparse.Namespace) -> str:
+    """Return the path of the populate file of a dataset with one airline
+    flying args.fleet planes, each with a flight every day or two,
+    generating it in args.data_dir if it is not there already.
+    """
+    out_dir = os.path.join(args.data_dir, f"fleet_{args.fleet}")
+    populate = os.path.join(out_dir, "populate_data.sql")
+    if not os.path.exists(populate):
+        generate(out_dir, args.seed, airlines=1, cities=20, airports=40,
+                 passengers=5_000, planes=args.fleet, routes=100,
+                 flights=1_000 * args.fleet, bookings=3_000 * args.fleet)
+    return populate
+
+
+def bench_grounding(args: argparse.Namespace) -> list[dict]:
+    """Ground args.grounded of the planes of the fleet dataset for a month,
+    and compare reassigning their flights with one reassign_plane call per
+    plane against a single reassign_planes call: the time taken, the
+    flights reported unscheduled, and the flights of the month left on a
+    grounded plane (which reassign_plane can move a flight back to).
+    """
+    populate = fleet_dataset(args)
+    results = []
+    for name in ("reassign_plane", "reassign_planes"):
+        bulk_setup(args.dbname, args.user, args.password, args.schema,
+                   populate, args.workers)
+        a2 = AirTravel()
+        assert a2.connect(args.dbname, args.user, args.password)
+        try:
+            cursor = a2.connection.cursor()
+            cursor.execute("SELECT tail_number FROM Plane "
+                           "ORDER BY tail_number")
+            planes = [row[0] for row in cursor.fetchall()]
+            a2.connection.rollback()
+            grounded = sorted(random.Random(args.seed).sample(
+                planes, int(len(planes) * args.grounded)))
+
+            begin = time.perf_counter()
+            if name == "reassign_plane":
+                unscheduled = set()
+                for plane in grounded:
+                    unscheduled.update(a2.reassign_plane(
+                        plane, GROUNDING_START, GROUNDING_END))
+            else:
+                unscheduled = set(a2.reassign_planes(
+                    grounded, GROUNDING_START, GROUNDING_END))
+            elapsed = time.perf_counter() - begin
+
+            cursor.execute(
+                "SELECT COUNT(*) FROM Flight WHERE plane = ANY(%s) "
+                "AND sched_dept >= %s AND sched_dept < %s::date + 1",
+                (grounded, GROUNDING_START, GROUNDING_END))
+            stranded = cursor.fetchone()[0]
+            cursor.close()
+            a2.connection.rollback()
+        finally:
+            a2.disconnect()
+        print(f"{name:<28} planes={len(grounded):<5} {elapsed:8.3f}s "
+              f"unscheduled={len(unscheduled):<6} on grounded={stranded}")
+        results.append({"name": name, "planes": len(grounded),
+                        "seconds": elapsed, "unscheduled": len(unscheduled),
+                        "on_grounded": stranded})
+    return results
+
+
+def server_times(cursor: pg_ext.cursor, sql: str, params, repeat: int
+                 ) -> list[float]:
+    """Run <sql> with <params> <repeat> times under EXPLAIN ANALYZE using
+    <cursor>, rolling back after each run, and return the planning plus
+    execution time of each run in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        summary = explain(cursor, sql, params)
+        cursor.connection.rollback()
+        times.append((summary["planning_ms"] + summary["execution_ms"])
+                     / 1000)
+    return times
+
+
+def bench_prepared(args: argparse.Namespace) -> list[dict]:
+    """Load the dataset of the last of args.scales, and compare the server
+    time of each statement AirTravel prepares, as plain SQL and with
+    EXECUTE, over args.repeat runs with the parameters of
+    index_advisor.airtravel_workload; then compare the latency of
+    make_booking with and without prepared statements.
+    """
+    bulk_setup(args.dbname, args.user, args.password, args.schema,
+               dataset(args, args.scales[-1]), args.workers)
+    results = []
+    a2 = AirTravel()
+    assert a2.connect(args.dbname, args.user, args.password)
+    try:
+        cursor = a2.connection.cursor()
+        workload = airtravel_workload(cursor)
+        a2.connection.rollback()
+        names = dict(_PREPARED_SQL)
+        for name, sql, params in workload:
+            if sql not in names:
+                continue
+            plain = server_times(cursor, sql, params, args.repeat)
+            text, order = _numbered(sql)
+            statement = f"bench_{names[sql].replace(' ', '_')}"
+            cursor.execute(f"PREPARE {statement} AS {text}")
+            prepared = server_times(
+                cursor, f"EXECUTE {statement} "
+                        f"({', '.join(['%s'] * len(order))})",
+                [params[param] for param in order], args.repeat)
+            cursor.execute(f"DEALLOCATE {statement}")
+            for label, samples in (("plain", plain), ("prepared", prepared)):
+                results.append(summarize(f"{name} ({label})", samples))
+        cursor.close()
+
+        requests = booking_requests(a2, 2 * args.bookings, args.seed)
+        for label, statements, batch in (
+                ("plain", None, requests[:args.bookings]),
+                ("prepared", PreparedStatements(),
+                 requests[args.bookings:])):
+            a2.statements = statements
+            samples, _ = time_calls(a2.make_booking, batch)
+            results.append(summarize(f"make_booking ({label})", samples))
+    finally:
+        a2.disconnect()
+    return results
+
+
+BENCHMARKS = {
+    "async": bench_async,
+    "batch": bench_batch,
+    "booking": bench_booking,
+    "grounding": bench_grounding,
+    "prepared": bench_prepared,
+    "suite": bench_suite,
+}
+
+
+def main() -> None:
+    """Parse the command line and run the selected benchmark."""
+    parser = argparse.ArgumentParser(description="Run AirTravel benchmarks.")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("dbname")
+    parser.add_argument("user")
+    parser.add_argument("password")
+    parser.add_argument("--schema", default=SCHEMA_FILE)
+    parser.add_argument("--data", default=DATA_FILE)
+    parser.add_argument("--bookings", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=343)
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.01, 0.1])
+    parser.add_argument("--data-dir", default="./generated")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="connections used to load each dataset")
+    parser.add_argument("--reassigns", type=int, default=20)
+    parser.add_argument("--fleet", type=int, default=300,
+                        help="planes of the grounding benchmark's airline")
+    parser.add_argument("--grounded", type=float, default=0.7,
+                        help="share of the fleet the grounding benchmark "
+                             "grounds")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--reports", nargs="*", default=REPORT_FILES)
+    parser.add_argument("--results", default="./benchmark_results.json")
+    parser.add_argument("--baseline",
+                        help="results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=1.5,
+                        help="report latencies this many times slower")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""CSC343 Assignment 2
+
+=== Module Description ===
+
+This file contains a generator of synthetic data for the A2 schema. Given a
+seed and the size of each relation, it writes one CSV file per relation and
+a populate_data.sql file pointing at them, which can be loaded with setup().
+
+The output always satisfies a2_airtravel_schema.ddl, including the
+assumptions stated in its comments:
+    * every plane has at least one seat;
+    * a plane has no overlapping flights, and is owned by the airline that
+      operates the routes it flies;
+    * a flight has a price for a seating class iff its plane has seats of
+      that class;
+    * a booking is for a seat on the flight's plane and is made before the
+      flight's scheduled departure;
+    * an arrival is recorded only for a departed flight, after it departed.
+
+Rows are written as they are generated, so memory use depends on the number
+of airlines, airports, planes and routes, but not on the number of flights
+or bookings. The same seed and sizes always produce the same files.
+
+Example:
+    python generate_data.py ./data_large --flights 50000 --bookings 5000000
+"""
+import argparse
+import csv
+import os
+import random
+from datetime import datetime, timedelta
+
+# Seat layouts: for each model, the (class, number of rows, seat letters)
+# of each cabin, from front to back.
+LAYOUTS = {
+    "Boeing 737": [("first", 4, "ACDF"), ("economy", 26, "ABCDEF")],
+    "Boeing 777": [("first", 2, "AEK"), ("business", 8, "ACDHJK"),
+                   ("economy", 38, "ABCDEFGHJK")],
+    "Airbus A320": [("business", 3, "ACDF"), ("economy", 25, "ABCDEF")],
+    "Airbus A350": [("first", 2, "ADK"), ("business", 10, "ACDGHK"),
+                    ("economy", 32, "ABCDEFGHK")],
+    "Embraer E175": [("first", 3, "ACD"), ("economy", 17, "ACDF")],
+    "Dash 8-400": [("economy", 20, "ABCD")],
+}
+
+# Base price of a seat in each class, per hour of flight.
+HOURLY_PRICE = {"first": 450, "business": 260, "economy": 90}
+
+FIRST_NAMES = ["Ada", "Ben", "Chloe", "Dev", "Elif", "Farah", "Gus", "Hana",
+               "Ivan", "Jia", "Kofi", "Lena", "Mateo", "Nia", "Omar", "Priya",
+               "Quinn", "Rosa", "Sami", "Tao", "Uma", "Vik", "Wen", "Yara"]
+LAST_NAMES = ["Alvarez", "Brown", "Chen", "Dubois", "Eze", "Fischer",
+              "Garcia", "Haddad", "Ito", "Jensen", "Kim", "Lopez", "Moreau",
+              "Nguyen", "Okafor", "Patel", "Rossi", "Singh", "Tanaka",
+              "Usman", "Volkov", "Wong", "Yilmaz", "Zhou"]
+COUNTRIES = ["Canada", "USA", "Mexico", "Brazil", "UK", "France", "Germany",
+             "Turkey", "UAE", "India", "China", "Japan", "South Korea",
+             "Singapore", "Australia", "South Africa"]
+
+FILE_NAMES = ["City", "Airline", "Passenger", "Plane", "Seat", "Airport",
+              "Route", "Flight", "Departure", "Arrival", "FlightPrice",
+              "Booking"]
+
+# Flights are spread between the first and last departure. Those departing
+# before NOW have departed (and, most of the time, arrived); later ones are
+# still scheduled.
+FIRST_DEPARTURE = datetime(2022, 1, 1)
+LAST_DEPARTURE = datetime(2026, 1, 1)
+NOW = datetime(2025, 3, 1)
+
+# The number of rows of each relation (and about the number of bookings) in
+# a dataset of scale 1.
+SIZES = {
+    "airlines": 20,
+    "cities": 300,
+    "airports": 500,
+    "passengers": 200_000,
+    "planes": 1_000,
+    "routes": 5_000,
+    "flights": 50_000,
+    "bookings": 2_000_000,
+}
+
+
+def code(n: int, length: int) -> str:
+    """Return the <n>-th code of <length> upper-case letters, in order
+    AA..A, AA..B, ..., ZZ..Z.
+    """
+    letters = []
+    for _ in range(length):
+        n, digit = divmod(n, 26)
+        letters.append(chr(ord("A") + digit))
+    return "".join(reversed(letters))
+
+
+def seat_layout(model: str) -> list[tuple[int, str, str]]:
+    """Return the (row, letter, class) of every seat of a plane of <model>,
+    in row and letter order.
+    """
+    seats, row = [], 1
+    for seat_class, rows, letters in LAYOUTS[model]:
+        for _ in range(rows):
+            seats.extend((row, letter, seat_class) for letter in letters)
+            row += 1
+    return seats
+
+
+def timestamp(moment: datetime) -> str:
+    """Return <moment> in the format used by the CSV files."""
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def generate(out_dir: str, seed: int, airlines: int, cities: int,
+             airports: int, passengers: int, planes: int, routes: int,
+             flights: int, bookings: int) -> dict[str, int]:
+    """Write a dataset with the given number of rows in each relation (and
+    about <bookings> bookings) to the directory <out_dir>, and return the
+    number of rows written to each file.
+    """
+    if (airlines > 26 ** 2 or airports > 26 ** 3 or planes > 26 * 10 ** 5
+            or routes > airlines * 9999):
+        raise ValueError("too many airlines, airports, planes or routes "
+                         "for their codes")
+    if airports < 2 or routes < airlines or planes < 1:
+        raise ValueError("need 2 airports and a route for every airline")
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    handles = {name: open(os.path.join(out_dir, f"{name}.csv"), "w",
+                          newline="", encoding="utf-8")
+               for name in FILE_NAMES}
+    writers = {name: csv.writer(handle, lineterminator="\n")
+               for name, handle in handles.items()}
+    counts = dict.fromkeys(FILE_NAMES, 0)
+
+    def write(name: str, row: tuple) -> None:
+        writers[name].writerow(row)
+        counts[name] += 1
+
+    try:
+        for cid in range(1, cities + 1):
+            write("City", (cid, f"City {cid}", rng.choice(COUNTRIES)))
+
+        airline_codes = [code(i, 2) for i in range(airlines)]
+        for airline in airline_codes:
+            write("Airline", (airline, f"Airline {airline}"))
+
+        for pid in range(1, passengers + 1):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            write("Passenger",
+                  (pid, first, last, f"{first}.{last}.{pid}@example.com"))
+
+        # Planes and their seats. The seats of a plane get consecutive sids,
+        # so a plane only needs its model and its first sid.
+        models = sorted(LAYOUTS)
+        layouts = {model: seat_layout(model) for model in models}
+        fleet = {airline: [] for airline in airline_codes}
+        plane_info = {}
+        next_sid = 1
+        for i in range(planes):
+            tail = f"{code(i // 10 ** 5, 1)}{i % 10 ** 5:05d}"
+            model = rng.choice(models)
+            airline = airline_codes[i % airlines]
+            write("Plane", (tail, model, airline))
+            fleet[airline].append(tail)
+            plane_info[tail] = (model, next_sid)
+            for row, letter, seat_class in layouts[model]:
+                write("Seat", (next_sid, tail, row, letter, seat_class))
+                next_sid += 1
+
+        airport_codes = [code(i, 3) for i in range(airports)]
+        for i, airport in enumerate(airport_codes):
+            write("Airport", (airport, f"Airport {airport}",
+                              i % cities + 1))
+
+        # Routes, spread over the airlines so that each has at least one.
+        # Every route gets a typical duration.
+        airline_routes = {airline: [] for airline in airline_codes}
+        for i in range(routes):
+            airline = airline_codes[i % airlines]
+            flight_num = f"{airline}{len(airline_routes[airline]) + 1}"
+            source, destination = rng.sample(airport_codes, 2)
+            write("Route", (flight_num, airline, source, destination))
+            minutes = rng.randint(45, 15 * 60)
+            airline_routes[airline].append((flight_num, minutes))
+
+        # Flights, plane by plane, one after the other with at least two
+        # hours between them, so that no plane has overlapping flights.
+        # Everything about a flight is written as soon as it is generated.
+        per_plane, extra = divmod(flights, planes)
+        span = (LAST_DEPARTURE - FIRST_DEPARTURE) / timedelta(minutes=1)
+        slack = max(0, int(span / (per_plane + 1)) - 10 * 60)
+        per_flight = bookings / flights if flights else 0
+        fid = bid = 1
+        for i, (tail, (model, first_sid)) in enumerate(plane_info.items()):
+            airline = airline_codes[i % airlines]
+            layout = layouts[model]
+            classes = sorted({seat_class for _, _, seat_class in layout})
+            dept = FIRST_DEPARTURE + timedelta(minutes=rng.randint(0, 7200))
+            for _ in range(per_plane + (i < extra)):
+                flight_num, minutes = rng.choice(airline_routes[airline])
+                duration = timedelta(minutes=minutes + rng.randint(-15, 15))
+                arrival = dept + duration
+                write("Flight", (fid, flight_num, tail, timestamp(dept),
+                                 timestamp(arrival)))
+
+                prices = {}
+                for seat_class in classes:
+                    base = HOURLY_PRICE[seat_class] * max(minutes, 60) / 60
+                    prices[seat_class] = round(base * rng.uniform(0.7, 1.3))
+                    write("FlightPrice", (fid, seat_class,
+                                          prices[seat_class]))
+
+                if dept < NOW:
+                    actual_dept = dept + timedelta(
+                        minutes=rng.randint(-10, 120))
+                    write("Departure", (fid, timestamp(actual_dept)))
+                    actual_arrival = actual_dept + duration + timedelta(
+                        minutes=rng.randint(-20, 60))
+                    if actual_arrival < NOW:
+                        write("Arrival", (fid, timestamp(
+                            max(actual_arrival,
+                                actual_dept + timedelta(minutes=1)))))
+
+                taken = min(len(layout),
+                            round(rng.uniform(0, 2 * per_flight)))
+                for index in sorted(rng.sample(range(len(layout)), taken)):
+                    seat_class = layout[index][2]
+                    booked_at = dept - timedelta(
+                        minutes=rng.randint(61, 120 * 24 * 60))
+                    price = round(prices[seat_class]
+                                  * rng.uniform(0.8, 1.2), 2)
+                    write("Booking", (bid, rng.randint(1, passengers),
+                                      first_sid + index, fid, price,
+                                      timestamp(booked_at)))
+                    bid += 1
+
+                fid += 1
+                dept = arrival + timedelta(
+                    hours=2, minutes=rng.randint(0, 2 * slack))
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+    with open(os.path.join(out_dir, "populate_data.sql"), "w") as populate:
+        for name in FILE_NAMES:
+            path = os.path.join(out_dir, f"{name}.csv")
+            populate.write(f"\\copy {name} FROM '{path}' WITH (FORMAT CSV);\n")
+    return counts
+
+
+def scaled_sizes(scale: float) -> dict[str, int]:
+    """Return the sizes of a dataset of scale <scale>."""
+    return {name: max(1, int(size * scale)) for name, size in SIZES.items()}
+
+
+def main() -> None:
+    """Parse the command line and generate the dataset."""
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic dataset for the A2 schema.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--seed", type=int, default=343)
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="multiply every size below by this factor")
+    for name, size in SIZES.items():
+        parser.add_argument(f"--{name}", type=int, default=size)
+    args = parser.parse_args()
+
+    sizes = {name: max(1, int(getattr(args, name) * args.scale))
+             for name in SIZES}
+    counts = generate(args.out_dir, args.seed, **sizes)
+    for name, count in counts.items():
+        print(f"{name:<12} {count:>12,}")
+
+
+if __name__ == "__main__":
+    main()
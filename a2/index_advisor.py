@@ -0,0 +1,228 @@
+"""CSC343 Assignment 2
+
+=== Module Description ===
+
+This file contains a small index advisor. It runs EXPLAIN (ANALYZE, BUFFERS)
+over the queries AirTravel sends and the report queries in q1.sql - q5.sql,
+and reports the sequential scans in each plan, with how many rows they read
+and threw away, so that missing indexes stand out.
+
+With --compare, the workload is run once without and once with the indexes
+in performance_indexes.sql, to show what each index pays for.
+
+Example:
+    python index_advisor.py csc343h-user user "" --compare
+"""
+import argparse
+import re
+from datetime import timedelta
+from typing import Iterator, Optional
+
+import psycopg2 as pg
+import psycopg2.extensions as pg_ext
+
+from a2_embedded import (
+    _BOOK_SQL, _PLANE_CAPACITY_SQL, _REASSIGN_DEMAND_SQL, _REASSIGN_FLEET_SQL,
+    _REASSIGN_SCHEDULE_SQL, _REASSIGN_TARGETS_SQL, _REASSIGN_UPDATE_SQL,
+    _ROUTE_GRAPH_SQL, _SEAT_MAP_SQL, _UNREACHABLE_SQL, _open_connection,
+    _reassign_window, _split_statements
+)
+
+INDEX_FILE = "./performance_indexes.sql"
+REPORT_FILES = ["./q1.sql", "./q2.sql", "./q3.sql", "./q4.sql", "./q5.sql"]
+
+
+def airtravel_workload(cursor: pg_ext.cursor) -> list[tuple[str, str, dict]]:
+    """Return the (name, sql, params) of each query AirTravel sends, with
+    parameters taken from the data <cursor> can see: the first flight, one
+    of its seats, and a year of its plane's schedule.
+    """
+    cursor.execute(
+        "SELECT f.fid, f.plane, s.row, s.letter, f.sched_dept, r.source, "
+        "       (SELECT MIN(pid) FROM Passenger) "
+        "FROM Flight f JOIN Seat s ON s.plane = f.plane "
+        "JOIN Route r ON r.flight_num = f.route "
+        "ORDER BY f.fid, s.row DESC, s.letter LIMIT 1"
+    )
+    fid, plane, row, letter, dept, source, pid = cursor.fetchone()
+    reassign = {"planes": [plane], "start": dept.date(),
+                "end": dept.date() + timedelta(days=365)}
+    cursor.execute(_REASSIGN_TARGETS_SQL, reassign)
+    targets = cursor.fetchall()
+    reassign.update(_reassign_window(targets, reassign["start"],
+                                     reassign["end"]))
+    fids = [target[0] for target in targets]
+    return [
+        ("make_booking", _BOOK_SQL, {
+            "bid": -1, "pid": pid, "fid": fid, "row": row, "letter": letter,
+            "ts": dept - timedelta(days=1)}),
+        ("route graph", _ROUTE_GRAPH_SQL, {}),
+        ("find_unreachable_from (SQL)", _UNREACHABLE_SQL,
+         {"airport": source}),
+        ("plane_capacity", _PLANE_CAPACITY_SQL, {"plane": plane}),
+        ("seat_map", _SEAT_MAP_SQL, {"fid": fid}),
+        ("reassign targets", _REASSIGN_TARGETS_SQL, reassign),
+        ("reassign fleet", _REASSIGN_FLEET_SQL, reassign),
+        ("reassign schedule", _REASSIGN_SCHEDULE_SQL, reassign),
+        ("reassign demand", _REASSIGN_DEMAND_SQL, {"fids": fids}),
+        ("reassign update", _REASSIGN_UPDATE_SQL,
+         {"fids": fids, "tails": [plane] * len(fids)}),
+    ]
+
+
+def split_statements(path: str) -> list[str]:
+    """Return the SQL statements in the file at <path>, without comments."""
+    return _split_statements(path)
+
+
+def plan_nodes(plan: dict) -> Iterator[dict]:
+    """Yield every node of the EXPLAIN (FORMAT JSON) plan tree <plan>."""
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def explain(cursor: pg_ext.cursor, sql: str, params: Optional[dict] = None
+            ) -> dict:
+    """Run <sql> with <params> under EXPLAIN (ANALYZE, BUFFERS) using
+    <cursor>, and return a summary of the plan: its planning and execution
+    time in milliseconds, and one (relation, rows read, rows removed by the
+    filter, buffers) tuple per sequential scan.
+    """
+    cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+    result = cursor.fetchone()[0][0]
+    seq_scans = []
+    for node in plan_nodes(result["Plan"]):
+        if node["Node Type"] == "Seq Scan":
+            loops = node.get("Actual Loops", 1)
+            seq_scans.append((
+                node["Relation Name"],
+                node.get("Actual Rows", 0) * loops,
+                node.get("Rows Removed by Filter", 0) * loops,
+                node.get("Shared Hit Blocks", 0)
+                + node.get("Shared Read Blocks", 0),
+            ))
+    return {
+        "planning_ms": result.get("Planning Time", 0.0),
+        "execution_ms": result.get("Execution Time", 0.0),
+        "seq_scans": seq_scans,
+        "plan": result["Plan"],
+    }
+
+
+def analyze_workload(connection: pg_ext.connection,
+                     report_files: list[str]) -> dict[str, dict]:
+    """Explain every query of the AirTravel workload and every report in
+    <report_files> using <connection>, and return the summary of each by
+    name. Nothing is changed in the database: each query runs in its own
+    transaction, which is rolled back.
+
+    A query that fails is summarized as {"error": <message>}.
+    """
+    cursor = connection.cursor()
+    summaries = {}
+    workload = airtravel_workload(cursor)
+    connection.rollback()
+    for name, sql, params in workload:
+        try:
+            summaries[name] = explain(cursor, sql, params)
+        except pg.Error as ex:
+            summaries[name] = {"error": str(ex).splitlines()[0]}
+        connection.rollback()
+
+    for path in report_files:
+        name = path.rsplit("/", 1)[-1]
+        try:
+            summary = {"error": "no INSERT INTO statement found"}
+            for statement in split_statements(path):
+                if re.match(r"INSERT\s+INTO\s+q\d", statement, re.IGNORECASE):
+                    summary = explain(cursor, statement)
+                else:
+                    cursor.execute(statement)
+            summaries[name] = summary
+        except pg.Error as ex:
+            summaries[name] = {"error": str(ex).splitlines()[0]}
+        connection.rollback()
+    cursor.close()
+    return summaries
+
+
+def index_names(path: str) -> list[str]:
+    """Return the names of the indexes created in the file at <path>."""
+    with open(path, "r") as sql_file:
+        return re.findall(r"CREATE INDEX IF NOT EXISTS (\w+)",
+                          sql_file.read())
+
+
+def apply_indexes(connection: pg_ext.connection, path: str) -> None:
+    """Create the indexes in the file at <path> using <connection>."""
+    cursor = connection.cursor()
+    with open(path, "r") as sql_file:
+        cursor.execute(sql_file.read())
+    connection.commit()
+    cursor.close()
+
+
+def drop_indexes(connection: pg_ext.connection, path: str) -> None:
+    """Drop the indexes created in the file at <path> using <connection>,
+    and refresh the planner's statistics.
+    """
+    cursor = connection.cursor()
+    for name in index_names(path):
+        cursor.execute(f"DROP INDEX IF EXISTS {name}")
+    cursor.execute("ANALYZE")
+    connection.commit()
+    cursor.close()
+
+
+def describe(summary: dict) -> str:
+    """Return a one-line description of the plan summary <summary>."""
+    if "error" in summary:
+        return f"failed: {summary['error']}"
+    scans = ", ".join(
+        f"{relation} (read {rows}, removed {removed}, {buffers} buffers)"
+        for relation, rows, removed, buffers in summary["seq_scans"])
+    return (f"{summary['planning_ms']:8.3f}ms plan "
+            f"{summary['execution_ms']:9.3f}ms run  "
+            f"seq scans: {scans or 'none'}")
+
+
+def main() -> None:
+    """Parse the command line and report on the workload."""
+    parser = argparse.ArgumentParser(
+        description="Report the sequential scans of the AirTravel queries.")
+    parser.add_argument("dbname")
+    parser.add_argument("user")
+    parser.add_argument("password")
+    parser.add_argument("--indexes", default=INDEX_FILE)
+    parser.add_argument("--reports", nargs="*", default=REPORT_FILES)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--apply", action="store_true",
+                       help="create the indexes before reporting")
+    group.add_argument("--compare", action="store_true",
+                       help="report without and then with the indexes")
+    args = parser.parse_args()
+
+    connection = _open_connection(args.dbname, args.user, args.password)
+    try:
+        if args.apply:
+            apply_indexes(connection, args.indexes)
+        if not args.compare:
+            for name, summary in analyze_workload(connection,
+                                                  args.reports).items():
+                print(f"{name:<30} {describe(summary)}")
+            return
+
+        drop_indexes(connection, args.indexes)
+        before = analyze_workload(connection, args.reports)
+        apply_indexes(connection, args.indexes)
+        after = analyze_workload(connection, args.reports)
+        for name in before:
+            print(f"{name}\n  without: {describe(before[name])}"
+                  f"\n  with:    {describe(after[name])}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+-- Performance indexes for the lookups made by AirTravel and the reports.
+-- Apply to a database created from a2_airtravel_schema.ddl, after the data
+-- is loaded. Run index_advisor.py with --compare to see, for every query,
+-- the sequential scans these indexes remove.
+--
+-- Lookups that are already covered by the schema are not repeated here:
+--	* Flight by plane and departure: UNIQUE (plane, sched_dept).
+--	* Seat by plane: UNIQUE (plane, row, letter).
+--	* Seat counts by plane and class: the PlaneCapacity summary.
+
+SET SEARCH_PATH TO AirTravel;
+
+-- The seat-taken check in make_booking, seat_map, the per-flight booking
+-- counts in reassign_plane, and route fullness (q1).
+CREATE INDEX IF NOT EXISTS booking_flight_idx ON Booking (flight);
+
+-- Bookings per passenger (q3, q5).
+CREATE INDEX IF NOT EXISTS booking_passenger_idx ON Booking (passenger);
+
+-- Date-range scans over the schedule (reassign_plane's window, q4).
+CREATE INDEX IF NOT EXISTS flight_sched_dept_idx ON Flight (sched_dept);
+
+-- Flights per route (q1, q2).
+CREATE INDEX IF NOT EXISTS flight_route_idx ON Flight (route);
+
+-- Each step of the recursive reachability walk.
+CREATE INDEX IF NOT EXISTS route_source_idx ON Route (source);
+
+-- The fleet of an airline (reassign_plane).
+CREATE INDEX IF NOT EXISTS plane_airline_idx ON Plane (airline);
+
+ANALYZE;
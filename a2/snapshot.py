@@ -0,0 +1,302 @@
+"""CSC343 Assignment 2
+
+=== Module Description ===
+
+This file contains a columnar snapshot of the schedule for offline
+analytics. export_snapshot copies Flight, Booking and FlightPrice, with the
+airlines, routes and planes they refer to, into a directory of NumPy arrays,
+one .npy file per column, described by a manifest.json. Snapshot opens such
+a directory with the arrays memory-mapped, and answers the q1 and q4
+aggregates with vectorized NumPy operations, so that heavy scans don't run
+against the database that make_booking uses.
+
+The columns are typed and compact:
+    * route, plane and airline codes are replaced by their index in the
+      routes, planes and airlines columns of the manifest (dictionary
+      encoding), and seat classes by their index in CLASSES;
+    * timestamps are datetime64[s], with NaT for a flight that has not
+      departed or arrived;
+    * prices are float32, like the REAL columns they come from.
+
+Example:
+    >>> a2.export_snapshot("./snapshot")
+    >>> Snapshot("./snapshot").route_fullness()
+"""
+import json
+import os
+from datetime import timedelta
+from typing import Optional
+
+import numpy as np
+import psycopg2.extensions as pg_ext
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# The seat classes in the order of the Class enum; a seat class is stored as
+# its index in this list.
+CLASSES = ["first", "business", "economy"]
+
+# The upper bounds of the fullness buckets of q1, as in fullness_bucket.
+FULLNESS_BOUNDS = [0.2, 0.4, 0.6, 0.8]
+FULLNESS_NAMES = ["very_low", "low", "fair", "normal", "high"]
+
+# For each table, the query that exports it (ordered by its key) and the
+# name and dtype of each column it returns. Code columns are returned as
+# codes and dictionary-encoded while they are read.
+_TABLES = {
+    "flight": ("""
+        SELECT f.fid, f.route, f.plane, f.sched_dept, f.sched_arrival,
+               d.date_time, a.date_time
+        FROM Flight f
+        LEFT JOIN Departure d ON d.fid = f.fid
+        LEFT JOIN Arrival a ON a.fid = f.fid
+        ORDER BY f.fid
+    """, [("fid", "int32"), ("route", "int32"), ("plane", "int32"),
+          ("sched_dept", "datetime64[s]"),
+          ("sched_arrival", "datetime64[s]"),
+          ("departure", "datetime64[s]"), ("arrival", "datetime64[s]")]),
+    "booking": ("""
+        SELECT b.bid, b.passenger, b.flight, s.class::text, b.price,
+               b.date_time
+        FROM Booking b JOIN Seat s ON s.sid = b.seat
+        ORDER BY b.bid
+    """, [("bid", "int32"), ("passenger", "int32"), ("flight", "int32"),
+          ("class", "uint8"), ("price", "float32"),
+          ("date_time", "datetime64[s]")]),
+    "flightprice": ("""
+        SELECT fid, class::text, price FROM FlightPrice ORDER BY fid, class
+    """, [("fid", "int32"), ("class", "uint8"), ("price", "float32")]),
+}
+
+
+def export_snapshot(connection: pg_ext.connection, path: str,
+                    chunk_size: int = 100_000) -> dict[str, int]:
+    """Write a snapshot of the database <connection> is connected to into
+    the directory <path>, and return the number of rows of each table.
+
+    Everything is read in one read-only, repeatable read transaction, so the
+    snapshot is consistent even while bookings are being made, and the large
+    tables are read through server-side cursors, <chunk_size> rows at a
+    time. The manifest is written last, so a directory without one holds an
+    unfinished export.
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    connection.rollback()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, "
+                       "READ ONLY")
+        cursor.execute("SELECT code FROM Airline ORDER BY code")
+        airlines = [row[0] for row in cursor.fetchall()]
+        airline_index = {code: i for i, code in enumerate(airlines)}
+        cursor.execute("SELECT flight_num, airline FROM Route "
+                       "ORDER BY flight_num")
+        routes = cursor.fetchall()
+        cursor.execute(
+            "SELECT p.tail_number, p.airline, COALESCE(SUM(pc.capacity), 0) "
+            "FROM Plane p LEFT JOIN PlaneCapacity pc "
+            "ON pc.plane = p.tail_number "
+            "GROUP BY p.tail_number ORDER BY p.tail_number")
+        planes = cursor.fetchall()
+        cursor.close()
+
+        # 코드는 매니페스트의 목록에서의 위치로 바꿔서 저장한다.
+        codes = {
+            ("flight", "route"): {code: i for i, (code, _) in
+                                  enumerate(routes)},
+            ("flight", "plane"): {code: i for i, (code, _, _) in
+                                  enumerate(planes)},
+        }
+        for table in ("booking", "flightprice"):
+            codes[table, "class"] = {name: i for i, name in
+                                     enumerate(CLASSES)}
+        _save(path, "route_airline", np.array(
+            [airline_index[airline] for _, airline in routes], "int32"))
+        _save(path, "plane_airline", np.array(
+            [airline_index[airline] for _, airline, _ in planes], "int32"))
+        _save(path, "plane_capacity", np.array(
+            [capacity for _, _, capacity in planes], "int32"))
+
+        rows = {}
+        for table, (query, columns) in _TABLES.items():
+            cursor = connection.cursor(name=f"{table}_snapshot")
+            cursor.itersize = chunk_size
+            cursor.execute(query)
+            chunks = []
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                chunks.append(_encode(table, columns, chunk, codes))
+            cursor.close()
+            rows[table] = sum(len(chunk[0]) for chunk in chunks)
+            for i, (column, dtype) in enumerate(columns):
+                values = [chunk[i] for chunk in chunks]
+                _save(path, f"{table}.{column}",
+                      np.concatenate(values) if values
+                      else np.empty(0, dtype))
+    finally:
+        cursor.close()
+        connection.rollback()
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "rows": rows,
+        "airlines": airlines,
+        "routes": [code for code, _ in routes],
+        "planes": [code for code, _, _ in planes],
+        "classes": CLASSES,
+        "columns": {table: [column for column, _ in columns]
+                    for table, (_, columns) in _TABLES.items()},
+    }
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1)
+    return rows
+
+
+def _encode(table: str, columns: list[tuple[str, str]], chunk: list[tuple],
+            codes: dict[tuple[str, str], dict]) -> list[np.ndarray]:
+    """Return the columns of the rows <chunk> of <table> as arrays of the
+    dtypes in <columns>, with the codes in <codes> replaced by indexes.
+    """
+    arrays = []
+    for (column, dtype), values in zip(columns, zip(*chunk)):
+        mapping = codes.get((table, column))
+        if mapping is not None:
+            values = [mapping[value] for value in values]
+        arrays.append(np.array(values, dtype))
+    return arrays
+
+
+def _save(path: str, name: str, values: np.ndarray) -> None:
+    """Write the column <values> to the file <name>.npy in <path>."""
+    np.save(os.path.join(path, f"{name}.npy"), values, allow_pickle=False)
+
+
+class Snapshot:
+    """A snapshot written by export_snapshot, with its columns
+    memory-mapped, so that only the pages a query touches are read.
+
+    === Instance Attributes ===
+    path: the directory of the snapshot.
+    airlines: the airline codes; an airline is stored as its index here.
+    routes: the route flight numbers; a route is stored as its index here.
+    planes: the tail numbers; a plane is stored as its index here.
+    rows: the number of rows of each table.
+    """
+    path: str
+    airlines: list[str]
+    routes: list[str]
+    planes: list[str]
+    rows: dict[str, int]
+    _columns: dict[str, np.ndarray]
+
+    def __init__(self, path: str) -> None:
+        """Open the snapshot in the directory <path>.
+
+        Raise ValueError if it is not a complete snapshot of this format.
+        """
+        try:
+            with open(os.path.join(path, MANIFEST_FILE)) as manifest_file:
+                manifest = json.load(manifest_file)
+        except FileNotFoundError:
+            raise ValueError(f"{path} does not hold a complete snapshot")
+        if manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"unsupported snapshot version "
+                             f"{manifest.get('version')}")
+        self.path = path
+        self.airlines = manifest["airlines"]
+        self.routes = manifest["routes"]
+        self.planes = manifest["planes"]
+        self.rows = manifest["rows"]
+        self._columns = {}
+
+    def column(self, name: str) -> np.ndarray:
+        """Return the column <name> (e.g. "booking.price"), memory-mapped
+        and read-only.
+        """
+        if name not in self._columns:
+            self._columns[name] = np.load(
+                os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self._columns[name]
+
+    def _flight_rows(self, fids: np.ndarray) -> np.ndarray:
+        """Return the row of each flight id in <fids> in the flight table."""
+        return np.searchsorted(self.column("flight.fid"), fids)
+
+    def route_fullness(self) -> list[tuple]:
+        """Return the rows of q1, as AirTravel.summary_report("q1") does:
+        for each route, by airline and flight number, the number of its
+        departed flights in each fullness bucket.
+        """
+        flights = self.rows["flight"]
+        bookings = np.bincount(
+            self._flight_rows(self.column("booking.flight")),
+            minlength=flights)
+        capacity = self.column("plane_capacity")[self.column("flight.plane")]
+        counted = ~np.isnat(self.column("flight.departure")) & (capacity > 0)
+        fullness = bookings[counted] / capacity[counted]
+        bucket = np.searchsorted(FULLNESS_BOUNDS, fullness, side="right")
+        routes = self.column("flight.route")[counted]
+        counts = np.bincount(
+            routes * len(FULLNESS_NAMES) + bucket,
+            minlength=len(self.routes) * len(FULLNESS_NAMES)
+        ).reshape(len(self.routes), len(FULLNESS_NAMES))
+
+        route_airline = self.column("route_airline")
+        result = [(self.airlines[route_airline[i]], route)
+                  + tuple(int(n) for n in counts[i])
+                  for i, route in enumerate(self.routes)]
+        return sorted(result)
+
+    def airline_stats(self) -> list[tuple]:
+        """Return the rows of q4, as AirTravel.summary_report("q4") does:
+        for each airline, its number of planes and routes, its average number
+        of flights per route, the average delay of its flights' arrivals,
+        and the average price paid for a seat in each class.
+        """
+        airlines = len(self.airlines)
+        route_airline = self.column("route_airline")
+        planes = np.bincount(self.column("plane_airline"), minlength=airlines)
+        routes = np.bincount(route_airline, minlength=airlines)
+        flight_airline = route_airline[self.column("flight.route")]
+        flights = np.bincount(flight_airline, minlength=airlines)
+
+        arrival = self.column("flight.arrival")
+        arrived = ~np.isnat(arrival)
+        delay = (arrival[arrived] - self.column("flight.sched_arrival")[
+            arrived]).astype("int64")
+        delay_sum = np.bincount(flight_airline[arrived], weights=delay,
+                                minlength=airlines)
+        delay_count = np.bincount(flight_airline[arrived],
+                                  minlength=airlines)
+
+        booking_airline = flight_airline[
+            self._flight_rows(self.column("booking.flight"))]
+        key = booking_airline * len(CLASSES) + self.column("booking.class")
+        size = airlines * len(CLASSES)
+        price_sum = np.bincount(
+            key, weights=self.column("booking.price").astype("float64"),
+            minlength=size).reshape(airlines, len(CLASSES))
+        price_count = np.bincount(key, minlength=size).reshape(
+            airlines, len(CLASSES))
+
+        def average(total: float, count: int) -> Optional[float]:
+            # REAL 값을 psycopg2 가 읽는 것처럼, float32 의 가장 짧은 표현으로.
+            return float(str(np.float32(total / count))) if count else None
+
+        result = []
+        for i, airline in enumerate(self.airlines):
+            result.append((
+                airline, int(planes[i]), int(routes[i]),
+                average(flights[i], routes[i]),
+                timedelta(seconds=delay_sum[i] / delay_count[i])
+                if delay_count[i] else None,
+                *(average(price_sum[i, c], price_count[i, c])
+                  for c in range(len(CLASSES)))
+            ))
+        return result